@@ -14,29 +14,33 @@ import pfslib.pfsargparse as pfsargparse
 import pfslib.pfsparams as pfsparams
 import pfslib.pfsrun as pfsrun
 
-# define and collect commandline arguments
-# (kept outside try-catch block to leave exception messages untouched)
-parser = pfsargparse.PFSArgParse(
-    description="Compare file listings stored in two Sqlite database files."
-)
-args = parser.parse_args()
-
-try:
-    # create parameter object
-    params = pfsparams.PFSParams(args)
-
-    print("Match and compare databases...")
-
-    run = pfsrun.PFSRun(params)
-
-    run.Run()
-except (FileNotFoundError) as e:
-    print(f"File not found: {e.args[0]}")
-except (IsADirectoryError) as e:
-    print(f"Directory error: {e.args[0]}")
-except (pfsrun.PFSRunException) as e:
-    print(f"Run error: {e.args[0]}")
-except (KeyboardInterrupt):
-    print("Cancelled by user!")
-except (Exception) as e:
-    print(f"Unhandled error: {e.args[0]}")
+# guarded since worker processes started for --jobs may import this module
+if __name__ == "__main__":
+    # define and collect commandline arguments
+    # (kept outside try-catch block to leave exception messages untouched)
+    parser = pfsargparse.PFSArgParse(
+        description="Compare file listings stored in two Sqlite database files."
+    )
+    args = parser.parse_args()
+
+    try:
+        # create parameter object
+        params = pfsparams.PFSParams(args)
+
+        print("Match and compare databases...")
+
+        run = pfsrun.PFSRun(params)
+
+        run.Run()
+    except (FileNotFoundError) as e:
+        print(f"File not found: {e.args[0]}")
+    except (IsADirectoryError) as e:
+        print(f"Directory error: {e.args[0]}")
+    except (ValueError) as e:
+        print(f"Parameter error: {e.args[0]}")
+    except (pfsrun.PFSRunException) as e:
+        print(f"Run error: {e.args[0]}")
+    except (KeyboardInterrupt):
+        print("Cancelled by user!")
+    except (Exception) as e:
+        print(f"Unhandled error: {e.args[0]}")
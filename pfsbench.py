@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Benchmark file listing comparison on generated listings.
+"""
+
+# local imports
+import pfslib.pfsargparse as pfsargparse
+import pfslib.pfsbench as pfsbench
+
+# guarded since benchmark runs are started in worker processes
+if __name__ == "__main__":
+    parser = pfsargparse.PFSBenchArgParse(
+        description="Benchmark comparison of generated file listings per size,"
+        + " match engine and output format."
+    )
+    args = parser.parse_args()
+
+    try:
+        pfsbench.runbenchmarks(args)
+    except (FileNotFoundError) as e:
+        print(f"File not found: {e.args[0]}")
+    except (ValueError) as e:
+        print(f"Parameter error: {e.args[0]}")
+    except (KeyboardInterrupt):
+        print("Cancelled by user!")
+    except (Exception) as e:
+        print(f"Unhandled error: {e.args[0]}")
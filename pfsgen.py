@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Generate a pair of synthetic file listing databases in the MiHsPyFList schema.
+"""
+
+# local imports
+import pfslib.pfsargparse as pfsargparse
+import pfslib.pfsgenerate as pfsgenerate
+
+if __name__ == "__main__":
+    parser = pfsargparse.PFSGenArgParse(
+        description="Generate synthetic source and target file listing databases."
+    )
+    args = parser.parse_args()
+
+    try:
+        print("Generate listings...")
+
+        pfsgenerate.generatelistings(
+            args.source,
+            args.target,
+            args.files,
+            args.depth,
+            args.filesperdir,
+            args.overlap,
+            args.drift,
+            args.columns,
+            args.seed,
+        )
+    except (ValueError) as e:
+        print(f"Parameter error: {e.args[0]}")
+    except (KeyboardInterrupt):
+        print("Cancelled by user!")
+    except (Exception) as e:
+        print(f"Unhandled error: {e.args[0]}")
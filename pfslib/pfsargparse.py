@@ -29,6 +29,182 @@ class PFSArgParse(ArgumentParser):
             + " default ignored",
         )
 
+        self.add_argument(
+            "-e",
+            "--engine",
+            dest="engine",
+            choices=["set", "merge", "row"],
+            default="set",
+            help="match engine: 'set' attaches both databases and classifies all files"
+            + " with one query per side, 'merge' streams both databases sorted by"
+            + " path in place with constant memory, 'row' queries the target once"
+            + " per source file (slow, kept as reference) [default=set]",
+        )
+
+        memcopy_group = self.add_mutually_exclusive_group()
+
+        memcopy_group.add_argument(
+            "--memcopy",
+            dest="memcopy",
+            action="store_const",
+            const=True,
+            default=None,
+            help="copy both databases into memory before comparison"
+            + " [default=chosen by database size and available memory]",
+        )
+        memcopy_group.add_argument(
+            "--no-memcopy",
+            dest="memcopy",
+            action="store_const",
+            const=False,
+            help="read both databases in place with read-only connections",
+        )
+
+        self.add_argument(
+            "--key-cache",
+            dest="keycache",
+            action="store_true",
+            default=False,
+            help="read prepared copies of the databases (sorted and indexed for"
+            + " matching) from cache files, built when missing or outdated",
+        )
+        self.add_argument(
+            "--cache-dir",
+            dest="cachedir",
+            type=pathlib.Path,
+            default=None,
+            help="with --key-cache, directory for the cache files, where the least"
+            + " recently used are deleted beyond --cache-size"
+            + " [default=next to each database file]",
+        )
+        self.add_argument(
+            "--cache-size",
+            dest="cachesize",
+            type=int,
+            default=10240,
+            help="with --cache-dir, maximum total size of the cache files in MiB"
+            + " [default=10240]",
+        )
+
+        self.add_argument(
+            "--digest",
+            dest="digest",
+            action="store_true",
+            default=False,
+            help="compute directory digests first and report sub-trees which are"
+            + " identical in both databases as same without comparing their files",
+        )
+        self.add_argument(
+            "--digest-cache",
+            dest="digestcache",
+            action="store_true",
+            default=False,
+            help="with --digest or --incremental, reuse and store directory digests"
+            + " in a cache file next to each database file",
+        )
+        self.add_argument(
+            "--incremental",
+            dest="incremental",
+            action="store_true",
+            default=False,
+            help="with SQLite outfile, store directory digests and result counts, and"
+            + " in the next run (with --update) compare only directories changed on"
+            + " either side, keeping the results of the others in table filecomp",
+        )
+
+        self.add_argument(
+            "--dirs-first",
+            dest="dirsfirst",
+            action="store_true",
+            default=False,
+            help="match directories first and classify all files in directories"
+            + " present in one database only as lonely or extra without file matching",
+        )
+        self.add_argument(
+            "--dir-records",
+            dest="dirrecords",
+            action="store_true",
+            default=False,
+            help="with --dirs-first, write one result per sub-tree present in one"
+            + " database only instead of one per file",
+        )
+
+        self.add_argument(
+            "--moves",
+            dest="moves",
+            action="store_true",
+            default=False,
+            help="after matching, report lonely and extra files with the same"
+            + " filename and attributes as moved (match 3), and with the same"
+            + " attributes (unique) as renamed (match 4), pairing them by a content"
+            + " hash column if present (not for --dir-records)",
+        )
+
+        self.add_argument(
+            "--base",
+            dest="base",
+            type=pathlib.Path,
+            default=None,
+            help="three-way comparison with a common base database, e.g. the listing"
+            + " of the last sync (merge engine only): each file is classified as"
+            + " unchanged (match 5), changed on source only (6), changed on target"
+            + " only (7) or conflicting (8)",
+        )
+
+        self.add_argument(
+            "--only-changes",
+            dest="onlychanges",
+            action="store_true",
+            default=False,
+            help="write lonely, extra and different files only (or directories"
+            + " containing such files with --summary-by-dir, or files not unchanged"
+            + " with --base)",
+        )
+        self.add_argument(
+            "--summary-by-dir",
+            dest="summarybydir",
+            action="store_true",
+            default=False,
+            help="write the number of common, lonely, extra, same and different"
+            + " files per directory, counted in aggregate, instead of one result"
+            + " per file",
+        )
+
+        self.add_argument(
+            "-j",
+            "--jobs",
+            dest="jobs",
+            type=int,
+            default=1,
+            help="number of worker processes matching files in shards of directories"
+            + " [default=1]",
+        )
+
+        self.add_argument(
+            "--async-output",
+            dest="asyncoutput",
+            action="store_true",
+            default=False,
+            help="write results on a background thread decoupled from comparison",
+        )
+        self.add_argument(
+            "--queue-size",
+            dest="queuesize",
+            type=int,
+            default=64,
+            help="with --async-output, maximum number of chunks of results waiting"
+            + " for the writer thread [default=64]",
+        )
+
+        self.add_argument(
+            "--profile",
+            dest="profile",
+            action="store_true",
+            default=False,
+            help="print time, rows per second, SQLite statements and peak memory"
+            + " of each phase (stored in table 'profile' of SQLite outfile)",
+        )
+
         self.add_argument(
             "source",
             type=pathlib.Path,
@@ -39,12 +215,25 @@ class PFSArgParse(ArgumentParser):
             type=pathlib.Path,
             help="database file on target",
         )
+        self.add_argument(
+            "--add-target",
+            dest="extratargets",
+            type=pathlib.Path,
+            metavar="TARGET",
+            action="append",
+            default=[],
+            help="additional target database compared with the source in the same"
+            + " pass (repeatable, merge engine only), results are written to one"
+            + " outfile per target numbered from 2, e.g. 'results-2.csv'",
+        )
         self.add_argument(
             "outfile",
             nargs="?",
             type=pathlib.Path,
             default=None,
-            help="CSV or database file to write results to [default=stdout]",
+            help="CSV (optionally compressed: .csv.gz, .csv.zst), JSON Lines (.jsonl),"
+            + " Arrow IPC (.arrow), Parquet (.parquet) or database file"
+            + " to write results to [default=stdout]",
         )
 
         fileopt_group = self.add_argument_group(
@@ -53,6 +242,16 @@ class PFSArgParse(ArgumentParser):
             + " (ignored otherwise)",
         )
 
+        fileopt_group.add_argument(
+            "-f",
+            "--format",
+            dest="outformat",
+            choices=["csv", "sqlite", "jsonl", "arrow", "parquet"],
+            default=None,
+            help="format of the outfile, Arrow and Parquet require package pyarrow"
+            + " [default=selected by outfile name, otherwise sqlite]",
+        )
+
         existmode_group = fileopt_group.add_mutually_exclusive_group()
 
         existmode_group.add_argument(
@@ -71,25 +270,226 @@ class PFSArgParse(ArgumentParser):
             action="store_const",
             const="a",
             default="",
-            help="update SQLite database or append to the CSV outfile if existent",
+            help="update SQLite database or append to the CSV or JSON Lines outfile"
+            + " if existent",
+        )
+
+        fileopt_group.add_argument(
+            "--buffer-size",
+            dest="buffersize",
+            type=int,
+            default=1 << 20,
+            help="size of CSV or JSON Lines outfile buffer in bytes [default=1048576]",
+        )
+        fileopt_group.add_argument(
+            "--flush-interval",
+            dest="flushinterval",
+            type=float,
+            default=1.0,
+            help="maximum time in seconds between flushes of CSV or JSON Lines outfile"
+            + " (0=flush only when buffer is full) [default=1.0]",
+        )
+        fileopt_group.add_argument(
+            "--batch-size",
+            dest="batchsize",
+            type=int,
+            default=1000,
+            help="number of result rows inserted into SQLite database at once"
+            + " [default=1000]",
+        )
+        fileopt_group.add_argument(
+            "--bulk",
+            dest="bulk",
+            action="store_true",
+            default=False,
+            help="insert all result rows of a phase into SQLite database in one"
+            + " transaction and rebuild indexes after loading",
+        )
+        fileopt_group.add_argument(
+            "--journal-mode",
+            dest="journalmode",
+            choices=["delete", "truncate", "persist", "memory", "wal", "off"],
+            default=None,
+            help="journal mode of SQLite database [default=SQLite default]",
+        )
+        fileopt_group.add_argument(
+            "--synchronous",
+            dest="synchronous",
+            choices=["off", "normal", "full", "extra"],
+            default=None,
+            help="synchronous setting of SQLite database [default=SQLite default]",
         )
 
-        dotmode_group = fileopt_group.add_mutually_exclusive_group()
+        progress_group = fileopt_group.add_mutually_exclusive_group()
 
-        dotmode_group.add_argument(
+        progress_group.add_argument(
             "-n",
+            "--no-progress",
             "--nodots",
-            dest="nodots",
+            dest="noprogress",
             action="store_true",
             default=False,
-            help="do not display dots for matches",
+            help="do not display the progress of matching",
+        )
+        progress_group.add_argument(
+            "-p",
+            "--progress-interval",
+            dest="progressinterval",
+            type=float,
+            default=1.0,
+            help="minimum time in seconds between two progress lines showing percent"
+            + " done, rows per second and estimated time remaining [default=1.0]",
         )
-        dotmode_group.add_argument(
+        progress_group.add_argument(
             "-d",
             "--dots",
             dest="dots",
             type=int,
-            default=0,
-            help="logarithmic number of matching files to display one dot for\n"
-            + "(i.e. 0=every file, 1=each 10 files, 2=each 100 files...)",
+            default=None,
+            help="deprecated and ignored, use --progress-interval instead",
         )
+
+
+class PFSGenArgParse(ArgumentParser):
+    """Argument parser for generating a pair of synthetic listing databases."""
+
+    def __init__(self, description):
+        super().__init__(description=description)
+
+        addgeneratorarguments(self)
+
+        self.add_argument(
+            "-n",
+            "--files",
+            dest="files",
+            type=int,
+            default=100000,
+            help="number of files in both listings [default=100000]",
+        )
+        self.add_argument(
+            "source",
+            type=pathlib.Path,
+            help="source database file to write",
+        )
+        self.add_argument(
+            "target",
+            type=pathlib.Path,
+            help="target database file to write",
+        )
+
+
+class PFSBenchArgParse(ArgumentParser):
+    """Argument parser for running benchmarks on generated listings."""
+
+    def __init__(self, description):
+        super().__init__(description=description)
+
+        addgeneratorarguments(self)
+
+        self.add_argument(
+            "-n",
+            "--files",
+            dest="files",
+            type=int,
+            nargs="+",
+            default=[10000, 100000, 1000000],
+            help="numbers of files in both listings to run benchmarks for"
+            + " [default=10000 100000 1000000]",
+        )
+        self.add_argument(
+            "-e",
+            "--engines",
+            dest="engines",
+            choices=["set", "merge", "row"],
+            nargs="+",
+            default=["set"],
+            help="match engines to benchmark [default=set]",
+        )
+        self.add_argument(
+            "-f",
+            "--formats",
+            dest="formats",
+            choices=["csv", "sqlite", "jsonl", "arrow", "parquet"],
+            nargs="+",
+            default=["csv", "sqlite", "jsonl", "arrow", "parquet"],
+            help="output formats to benchmark, formats missing packages are skipped"
+            + " [default=all]",
+        )
+        self.add_argument(
+            "-r",
+            "--repeat",
+            dest="repeat",
+            type=int,
+            default=1,
+            help="number of runs per benchmark, the fastest is reported [default=1]",
+        )
+        self.add_argument(
+            "-w",
+            "--workdir",
+            dest="workdir",
+            type=pathlib.Path,
+            default=None,
+            help="directory for generated listings (kept for reuse) and outfiles"
+            + " [default=pfsbench in the temporary directory]",
+        )
+        self.add_argument(
+            "-b",
+            "--baseline",
+            dest="baseline",
+            type=pathlib.Path,
+            default=None,
+            help="results file of an earlier benchmark to compare with",
+        )
+        self.add_argument(
+            "results",
+            nargs="?",
+            type=pathlib.Path,
+            default=None,
+            help="CSV file to write the results to [default=print only]",
+        )
+
+
+def addgeneratorarguments(parser):
+    """Add the arguments describing generated listings to a parser."""
+    parser.add_argument(
+        "--depth",
+        dest="depth",
+        type=int,
+        default=4,
+        help="maximum depth of the directory tree [default=4]",
+    )
+    parser.add_argument(
+        "--files-per-dir",
+        dest="filesperdir",
+        type=int,
+        default=20,
+        help="number of files per directory [default=20]",
+    )
+    parser.add_argument(
+        "--overlap",
+        dest="overlap",
+        type=float,
+        default=0.9,
+        help="ratio of files present in both listings [default=0.9]",
+    )
+    parser.add_argument(
+        "--drift",
+        dest="drift",
+        type=float,
+        default=0.05,
+        help="ratio of common files with different size or mtime [default=0.05]",
+    )
+    parser.add_argument(
+        "--column",
+        dest="columns",
+        action="append",
+        default=[],
+        help="name of an additional integer column, e.g. ctime (repeatable)",
+    )
+    parser.add_argument(
+        "--seed",
+        dest="seed",
+        type=int,
+        default=0,
+        help="seed of the random generator [default=0]",
+    )
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Module with functions running benchmarks of PFSRun on generated listings,
+end to end and per phase, for several sizes, match engines and output formats.
+Results are written to a CSV file which can be compared with later runs.
+"""
+
+# standard imports
+import contextlib
+import csv
+import io
+import multiprocessing
+import pathlib
+import tempfile
+import time
+from datetime import datetime
+
+# local imports
+import pfslib.pfsargparse as pfsargparse
+import pfslib.pfsgenerate as pfsgenerate
+import pfslib.pfsparams as pfsparams
+import pfslib.pfsrun as pfsrun
+
+# outfile name ending per output format
+FORMAT_SUFFIXES = {
+    "csv": ".csv",
+    "sqlite": ".db",
+    "jsonl": ".jsonl",
+    "arrow": ".arrow",
+    "parquet": ".parquet",
+}
+
+RESULT_COLUMNS = [
+    "timestamp",
+    "files",
+    "engine",
+    "format",
+    "phase",
+    "duration",
+    "nrows",
+    "rowspersec",
+    "nstatements",
+    "peakrss",
+]
+
+
+def getlistings(args, fileCount):
+    """Return the paths of the source and target listing for fileCount files,
+    generating them in the work directory if not existing yet.
+    """
+    name = "pfs_{0}_{1}_{2}_{3}_{4}_{5}_{6}".format(
+        fileCount,
+        args.depth,
+        args.filesperdir,
+        args.overlap,
+        args.drift,
+        "-".join(args.columns),
+        args.seed,
+    )
+    sourcePath = args.workdir / (name + "_source.db")
+    targetPath = args.workdir / (name + "_target.db")
+    if not (sourcePath.exists() and targetPath.exists()):
+        print(f"Generate listings with {fileCount} files...")
+        pfsgenerate.generatelistings(
+            sourcePath,
+            targetPath,
+            fileCount,
+            args.depth,
+            args.filesperdir,
+            args.overlap,
+            args.drift,
+            args.columns,
+            args.seed,
+        )
+    return sourcePath, targetPath
+
+
+def runbenchmark(pfsArgs):
+    """Run a comparison with the given pfs command line arguments (in a worker
+    process, so peak memory use is measured per run). Return a tuple with the
+    total time and the phases profiled.
+    """
+    args = pfsargparse.PFSArgParse("pfs").parse_args(pfsArgs)
+    run = pfsrun.PFSRun(pfsparams.PFSParams(args))
+
+    startTime = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run.Run()
+    duration = time.perf_counter() - startTime
+
+    return duration, run.Profile.Phases
+
+
+def runrepeated(pfsArgs, repeat):
+    """Run a benchmark repeat times, each in a new worker process, and return
+    the result of the fastest run.
+    """
+    runs = []
+    for _ in range(repeat):
+        with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+            runs.append(pool.apply(runbenchmark, (pfsArgs,)))
+    return min(runs, key=lambda r: r[0])
+
+
+def loadresults(resultsPath):
+    """Return a dictionary mapping (files, engine, format, phase) to the duration
+    in a results file.
+    """
+    with open(resultsPath, newline="") as resultsFile:
+        return {
+            (row["files"], row["engine"], row["format"], row["phase"]): float(
+                row["duration"]
+            )
+            for row in csv.DictReader(resultsFile, delimiter=";")
+        }
+
+
+def printresult(result, baseline):
+    """Print a result row, with the change relative to the baseline."""
+    files, engine, outFormat, phase, duration = result[1:6]
+    line = "\t{0:>9} {1:<6}{2:<8}{3:<9}{4:>10.3f}".format(
+        files, engine, outFormat, phase, duration
+    )
+    baseDuration = baseline.get((str(files), engine, outFormat, phase))
+    if baseDuration:
+        line += " {0:>+8.1%}".format(duration / baseDuration - 1)
+    print(line)
+
+
+def runbenchmarks(args):
+    """Run all benchmarks selected by the parsed arguments, print the results
+    and write them to the results file if given.
+    """
+    if args.workdir is None:
+        args.workdir = pathlib.Path(tempfile.gettempdir()) / "pfsbench"
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    if args.repeat < 1:
+        raise ValueError("Number of runs must be at least 1!")
+
+    baseline = loadresults(args.baseline) if args.baseline is not None else {}
+    timestamp = str(datetime.now())
+    results = []
+
+    print("\t{0:>9} {1:<6}{2:<8}{3:<9}{4:>10}".format(*RESULT_COLUMNS[1:6]))
+    for fileCount in args.files:
+        sourcePath, targetPath = getlistings(args, fileCount)
+        for engine in args.engines:
+            for outFormat in args.formats:
+                pfsArgs = getpfsargs(args, sourcePath, targetPath, engine, outFormat)
+                try:
+                    duration, phases = runrepeated(pfsArgs, args.repeat)
+                except ValueError as e:
+                    print(f"\tSkipped {outFormat}: {e.args[0]}")
+                    continue
+
+                total = ("total", duration, fileCount, fileCount / duration, None, None)
+                for phase in [total] + phases:
+                    result = [timestamp, fileCount, engine, outFormat] + list(phase)
+                    results.append(result)
+                    printresult(result, baseline)
+
+    if args.results is not None:
+        writeresults(args.results, results)
+
+
+def getpfsargs(args, sourcePath, targetPath, engine, outFormat):
+    """Return the pfs command line arguments of a benchmark run."""
+    outPath = args.workdir / ("pfs_result" + FORMAT_SUFFIXES[outFormat])
+    pfsArgs = ["-e", engine, "-o", "-n", "--profile"]
+    if "ctime" in args.columns:
+        pfsArgs.append("-c")
+    return pfsArgs + [str(sourcePath), str(targetPath), str(outPath)]
+
+
+def writeresults(resultsPath, results):
+    """Write the result rows to a CSV file."""
+    with open(resultsPath, "w", newline="") as resultsFile:
+        writer = csv.writer(resultsFile, delimiter=";")
+        writer.writerow(RESULT_COLUMNS)
+        writer.writerows(results)
+    print(f"Results written to {resultsPath}")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Module with functions comparing the attribute columns of common files in
+batches. If NumPy is installed, batches of integer attributes are compared
+with array operations for all columns at once.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# minimum number of files in a batch to compare with NumPy
+VECTORIZE_MIN_ROWS = 64
+
+# NumPy dtype kinds compared with array operations (signed, unsigned integers)
+VECTORIZE_KINDS = "iu"
+
+
+def gettyperank(value):
+    """Return the rank of a value's type in SQLite's sort order: NULL, numbers,
+    text, blobs.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    return 3
+
+
+def comparevalues(sourceValue, targetValue):
+    """Return 0 if two attribute values are the same, 1 if the source value is
+    greater and -1 if the target value is greater. Values of different types
+    which cannot be ordered (e.g. NULL and integer) are ordered like SQLite
+    does.
+    """
+    if sourceValue == targetValue:
+        return 0
+    try:
+        return 1 if sourceValue > targetValue else -1
+    except TypeError:
+        return 1 if gettyperank(sourceValue) > gettyperank(targetValue) else -1
+
+
+def comparesigns(pairs, colCount):
+    """Return a list with the comparison signs of each (sourceRow, targetRow)
+    pair, comparing row items 3 to colCount: 0 if the values are the same,
+    1 if the source value is greater and -1 if the target value is greater.
+    """
+    return [
+        [comparevalues(sourceRow[i], targetRow[i]) for i in range(3, colCount + 1)]
+        for sourceRow, targetRow in pairs
+    ]
+
+
+def comparesignsvectorized(pairs, colCount):
+    """Return the comparison signs like comparesigns as NumPy array with one row
+    per pair, or None if NumPy is missing or the values are not all integers.
+    """
+    if numpy is None:
+        return None
+
+    # no dtype forced, which would truncate floats and convert numeric text
+    sourceValues = numpy.array([sourceRow[3 : colCount + 1] for sourceRow, _ in pairs])
+    targetValues = numpy.array([targetRow[3 : colCount + 1] for _, targetRow in pairs])
+    if (
+        sourceValues.dtype.kind not in VECTORIZE_KINDS
+        or targetValues.dtype.kind not in VECTORIZE_KINDS
+    ):
+        # e.g. NULL, float or text values, or integers beyond 64 bits
+        return None
+
+    # no subtraction, which could overflow
+    return (sourceValues > targetValues).astype(numpy.int8) - (
+        sourceValues < targetValues
+    ).astype(numpy.int8)
+
+
+def comparebatch(pairs, colCount):
+    """Compare a batch of (sourceRow, targetRow) pairs of common files. Return
+    a tuple (signs, differences): signs as returned by comparesigns or
+    comparesignsvectorized, and for each pair the list of indices i - 1 of the
+    row items i which differ.
+    """
+    signs = None
+    if len(pairs) >= VECTORIZE_MIN_ROWS:
+        signs = comparesignsvectorized(pairs, colCount)
+
+    if signs is None:
+        signs = comparesigns(pairs, colCount)
+        differences = [
+            [j + 2 for j, s in enumerate(rowSigns) if s != 0] for rowSigns in signs
+        ]
+        return signs, differences
+
+    differences = [[] for _ in pairs]
+    for k in numpy.flatnonzero(signs.any(axis=1)):
+        differences[k] = (numpy.flatnonzero(signs[k]) + 2).tolist()
+    return signs, differences
+
+
+def selectrows(signs, indices):
+    """Return the comparison signs of the rows with the given indices."""
+    if isinstance(signs, list):
+        return [signs[k] for k in indices]
+    return signs[indices]
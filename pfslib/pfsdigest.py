@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Module with functions computing directory digests of a file listing database:
+a digest per directory over its files' names and attributes, and a subtree digest
+rolled up from its sub-directories (Merkle tree). Digests can be cached in a
+sidecar database next to the listing file.
+"""
+
+# standard imports
+import hashlib
+import pathlib
+
+# local imports
+import pfslib.pfsql as pfsql
+
+DIGEST_SIZE = 16
+CACHE_SUFFIX = ".pfsdigest"
+
+
+def getparentpath(path):
+    """Return the parent directory path of path or None for a root path."""
+    index = max(path.rfind("\\"), path.rfind("/"))
+    return path[:index] if index > 0 else None
+
+
+def getdirdigests(db, fileColumns):
+    """Return a dictionary mapping each directory path of the database to a tuple
+    (digest, file count) of the files directly in that directory. The digest is
+    computed over filename and the given filelist columns of all files.
+    """
+    filelistCols = ", ".join(("filelist." + c) for c in fileColumns)
+    selectCmd = (
+        f"SELECT dirlist.path, {filelistCols} FROM dirlist"
+        + " LEFT JOIN filelist ON dirlist.id = filelist.path"
+        + " ORDER BY dirlist.path, filelist.filename"
+    )
+
+    dirDigests = {}
+    currentPath = None
+    digest = None
+    fileCount = 0
+    for row in db[1].execute(selectCmd):
+        if row[0] != currentPath:
+            if currentPath is not None:
+                dirDigests[currentPath] = (digest.digest(), fileCount)
+            currentPath = row[0]
+            digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+            fileCount = 0
+        # directories without files have a single row with NULL file columns
+        if row[2] is not None:
+            # skip filelist.path (directory ID differs between databases)
+            digest.update(repr(row[2:]).encode("utf-8", "surrogatepass"))
+            fileCount += 1
+    if currentPath is not None:
+        dirDigests[currentPath] = (digest.digest(), fileCount)
+
+    return dirDigests
+
+
+def rollupdigests(dirDigests):
+    """Return a dictionary mapping each directory path to a tuple
+    (subtree digest, subtree file count), combining the digest of a directory
+    with the paths and subtree digests of its sub-directories.
+    """
+    children = {}
+    for path in dirDigests:
+        parent = getparentpath(path)
+        if parent in dirDigests:
+            children.setdefault(parent, []).append(path)
+
+    subtreeDigests = {}
+    # longer paths first, so all sub-directories are done before their parent
+    for path in sorted(dirDigests, key=len, reverse=True):
+        ownDigest, fileCount = dirDigests[path]
+        digest = hashlib.blake2b(ownDigest, digest_size=DIGEST_SIZE)
+        for child in sorted(children.get(path, [])):
+            childDigest, childFileCount = subtreeDigests[child]
+            digest.update(child.encode("utf-8", "surrogatepass"))
+            digest.update(childDigest)
+            fileCount += childFileCount
+        subtreeDigests[path] = (digest.digest(), fileCount)
+
+    return subtreeDigests
+
+
+def getcachepath(dbfilename):
+    """Return the path of the digest cache file for a listing database file."""
+    dbfilename = pathlib.Path(dbfilename)
+    return dbfilename.with_name(dbfilename.name + CACHE_SUFFIX)
+
+
+def getcachekey(dbfilename, fileColumns):
+    """Return the key identifying a listing file state, including its write-ahead
+    log (see pfsql.getfilestate), and the compared columns.
+    """
+    return f"{pfsql.getfilestate(dbfilename)}:{','.join(fileColumns)}"
+
+
+def loaddigestcache(dbfilename, fileColumns):
+    """Return the cached directory digests of a listing database file, or None
+    if there is no cache file or it does not match the file and columns.
+    """
+    cachePath = getcachepath(dbfilename)
+    if not cachePath.is_file():
+        return None
+
+    try:
+        cache = pfsql.opendb(cachePath.resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            res = cache[1].execute("SELECT value FROM meta WHERE key = 'key'")
+            row = res.fetchone()
+            if row is None or row[0] != getcachekey(dbfilename, fileColumns):
+                return None
+            res = cache[1].execute("SELECT path, digest, nfiles FROM dirdigest")
+            return {path: (digest, nfiles) for path, digest, nfiles in res}
+        finally:
+            pfsql.closedb(cache)
+    except Exception:
+        return None
+
+
+def savedigestcache(dbfilename, fileColumns, dirDigests):
+    """Save the directory digests of a listing database file to its cache file.
+    Return false if the cache file could not be written.
+    """
+    try:
+        cache = pfsql.opendb(getcachepath(dbfilename))
+        try:
+            pfsql.droptable(cache, "meta", True)
+            pfsql.droptable(cache, "dirdigest", True)
+            pfsql.createtable(cache, "meta", ["key PRIMARY KEY", "value"])
+            pfsql.createtable(
+                cache,
+                "dirdigest",
+                ["path PRIMARY KEY", "digest BLOB", "nfiles INTEGER"],
+            )
+            pfsql.insertrow(
+                cache, "meta", "?, ?", ("key", getcachekey(dbfilename, fileColumns))
+            )
+            cache[1].executemany(
+                "INSERT INTO dirdigest VALUES (?, ?, ?)",
+                ((path, d[0], d[1]) for path, d in dirDigests.items()),
+            )
+            cache[0].commit()
+        finally:
+            pfsql.closedb(cache)
+    except Exception:
+        return False
+    return True
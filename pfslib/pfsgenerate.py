@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Module with functions generating a pair of synthetic file listing databases
+in the MiHsPyFList schema (tables dirlist and filelist), e.g. for benchmarks.
+The listings are reproducible for the same parameters and seed.
+"""
+
+# standard imports
+import random
+
+# local imports
+import pfslib.pfsql as pfsql
+
+ROOT_PATH = "C:\\pfsbench"
+
+# file modification times are spread over about one year from this time
+BASE_TIME = 1672531200
+
+# number of rows inserted at once
+INSERT_ROWS = 10000
+
+
+def getdirpaths(dirCount, depth):
+    """Return a list of dirCount directory paths forming a tree below ROOT_PATH
+    (included) which is at most depth levels deep, in breadth-first order.
+    """
+    fanout = 1
+    while sum(fanout**level for level in range(depth + 1)) < dirCount:
+        fanout += 1
+
+    paths = [ROOT_PATH]
+    level = [ROOT_PATH]
+    while len(paths) < dirCount:
+        nextLevel = []
+        for parent in level:
+            for i in range(fanout):
+                nextLevel.append(f"{parent}\\d{i}")
+        level = nextLevel[: dirCount - len(paths)]
+        paths.extend(level)
+    return paths
+
+
+def generatefiles(dirCount, fileCount, overlap, drift, extraColumns, rng):
+    """Yield a tuple (dirIndex, sides, sourceRow, targetRow) for each generated
+    file, sides being 1 (source only), 2 (target only) or 3 (both). Rows hold
+    filename, size, mtime and the extra column values. Of the files not
+    present on both sides (1 - overlap) half are lonely and half are extra,
+    drift is the ratio of common files with changed attributes in the target.
+    """
+    for fileIndex in range(fileCount):
+        dirIndex = fileIndex % dirCount
+        fileName = f"f{fileIndex // dirCount}.dat"
+        row = [
+            fileName,
+            rng.randrange(1 << 24),
+            BASE_TIME + rng.randrange(1 << 25),
+        ] + [BASE_TIME + rng.randrange(1 << 25) for _ in extraColumns]
+
+        if rng.random() < overlap:
+            sides = 3
+        else:
+            sides = 1 if rng.random() < 0.5 else 2
+
+        targetRow = row
+        if sides == 3 and rng.random() < drift:
+            targetRow = list(row)
+            # change size or modification time
+            targetRow[rng.randrange(1, 3)] += 1
+        yield dirIndex, sides, row, targetRow
+
+
+def createlisting(dbFileName, extraColumns):
+    """Create an empty listing database and return the tuple (connection,
+    cursor).
+    """
+    db = pfsql.opendb(dbFileName)
+    pfsql.droptable(db, "dirlist", True)
+    pfsql.droptable(db, "filelist", True)
+    pfsql.createtable(db, "dirlist", ["id INTEGER PRIMARY KEY", "path"])
+    pfsql.createtable(
+        db,
+        "filelist",
+        [
+            "id INTEGER PRIMARY KEY",
+            "path INTEGER",
+            "filename",
+            "size INTEGER",
+            "mtime INTEGER",
+        ]
+        + [c + " INTEGER" for c in extraColumns],
+    )
+    return db
+
+
+def generatelistings(
+    sourceFileName,
+    targetFileName,
+    fileCount,
+    depth=4,
+    filesPerDir=20,
+    overlap=0.9,
+    drift=0.05,
+    extraColumns=(),
+    seed=0,
+):
+    """Write a source and a target listing database with about fileCount files
+    in total, in directories of filesPerDir files forming a tree at most depth
+    levels deep. overlap is the ratio of files present in both listings, drift
+    the ratio of common files whose size or mtime differs. extraColumns are
+    names of additional integer columns (e.g. 'ctime'). Directory IDs differ
+    between both listings as with separate scans.
+    """
+    if fileCount < 1 or depth < 1 or filesPerDir < 1:
+        raise ValueError("File count, depth and files per directory must be >= 1!")
+    if not (0 <= overlap <= 1 and 0 <= drift <= 1):
+        raise ValueError("Overlap and drift must be ratios between 0 and 1!")
+
+    rng = random.Random(seed)
+    dirPaths = getdirpaths(max(1, fileCount // filesPerDir), depth)
+    dirCount = len(dirPaths)
+
+    source = createlisting(sourceFileName, extraColumns)
+    target = createlisting(targetFileName, extraColumns)
+    try:
+        # target directories are listed in reverse order
+        source[1].executemany(
+            "INSERT INTO dirlist VALUES (?, ?)",
+            ((i + 1, path) for i, path in enumerate(dirPaths)),
+        )
+        target[1].executemany(
+            "INSERT INTO dirlist VALUES (?, ?)",
+            ((dirCount - i, path) for i, path in enumerate(dirPaths)),
+        )
+
+        qmarks = ", ".join((4 + len(extraColumns)) * "?")
+        insertCmd = f"INSERT INTO filelist VALUES (NULL, {qmarks})"
+        sourceRows = []
+        targetRows = []
+        for dirIndex, sides, sourceRow, targetRow in generatefiles(
+            dirCount, fileCount, overlap, drift, extraColumns, rng
+        ):
+            if sides & 1:
+                sourceRows.append([dirIndex + 1] + sourceRow)
+            if sides & 2:
+                targetRows.append([dirCount - dirIndex] + targetRow)
+            if len(sourceRows) + len(targetRows) >= INSERT_ROWS:
+                source[1].executemany(insertCmd, sourceRows)
+                target[1].executemany(insertCmd, targetRows)
+                sourceRows = []
+                targetRows = []
+        source[1].executemany(insertCmd, sourceRows)
+        target[1].executemany(insertCmd, targetRows)
+
+        source[0].commit()
+        target[0].commit()
+    finally:
+        pfsql.closedb(source)
+        pfsql.closedb(target)
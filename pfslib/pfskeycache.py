@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/17/2023"
+
+"""Module with functions maintaining prepared copies of file listing databases
+in cache files: directories renumbered in path order, files sorted by directory
+path and filename, with the indexes used for matching already built. Cache files
+are kept next to the listing file or in a cache directory, where the least
+recently used ones are evicted beyond a size limit.
+"""
+
+# standard imports
+import hashlib
+import os
+import pathlib
+
+# local imports
+import pfslib.pfsql as pfsql
+
+CACHE_SUFFIX = ".pfskeys"
+
+# version of the cache file layout, part of the cache key
+CACHE_VERSION = 1
+
+# size of the SQLite database file header (includes the file change counter)
+DB_HEADER_SIZE = 100
+
+
+def getcachepath(dbfilename, cacheDir=None):
+    """Return the path of the cache file for a listing database file, next to
+    it or in cacheDir (named by the hash of the resolved listing path).
+    """
+    dbfilename = pathlib.Path(dbfilename)
+    if cacheDir is None:
+        return dbfilename.with_name(dbfilename.name + CACHE_SUFFIX)
+
+    pathHash = hashlib.blake2b(
+        str(dbfilename.resolve()).encode("utf-8", "surrogatepass"), digest_size=8
+    )
+    return pathlib.Path(cacheDir) / (
+        f"{dbfilename.stem}-{pathHash.hexdigest()}{CACHE_SUFFIX}"
+    )
+
+
+def getcachekey(dbfilename):
+    """Return the key identifying a listing file state: size and modification
+    time of the file and its write-ahead log (see pfsql.getfilestate) and a hash
+    of the database header, which changes with every transaction written to the
+    file itself.
+    """
+    fileState = pfsql.getfilestate(dbfilename)
+    with open(dbfilename, "rb") as dbFile:
+        headerHash = hashlib.blake2b(dbFile.read(DB_HEADER_SIZE), digest_size=16)
+    return f"{CACHE_VERSION}:{fileState}:{headerHash.hexdigest()}"
+
+
+def isvalidcache(cachePath, cacheKey):
+    """Return true if the cache file exists and was built for cacheKey."""
+    if not cachePath.is_file():
+        return False
+
+    try:
+        cache = pfsql.opendb(cachePath.resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            res = cache[1].execute("SELECT value FROM meta WHERE key = 'key'")
+            row = res.fetchone()
+            return row is not None and row[0] == cacheKey
+        finally:
+            pfsql.closedb(cache)
+    except Exception:
+        return False
+
+
+def buildcache(dbfilename, cachePath, cacheKey):
+    """Write the prepared copy of a listing database to cachePath: dirlist with
+    IDs in path order, filelist (all columns) in order of directory path and
+    filename, indexes on dirlist(path, id) and filelist(path, filename). The
+    file is written under a temporary name and renamed when complete.
+    """
+    tempPath = cachePath.with_name(cachePath.name + f".{os.getpid()}.tmp")
+    tempPath.unlink(missing_ok=True)
+
+    cache = pfsql.opendb(tempPath)
+    try:
+        pfsql.setpragma(cache, "journal_mode", "off")
+        pfsql.setpragma(cache, "synchronous", "off")
+        pfsql.attachdb(
+            cache,
+            pathlib.Path(dbfilename).resolve().as_uri() + "?mode=ro",
+            "listing",
+        )
+        res = cache[1].execute(
+            "SELECT name FROM pragma_table_info('filelist', 'listing')"
+        )
+        colNames = [c for c, in res.fetchall() if c not in ("id", "path")]
+        fileCols = ", ".join(colNames)
+
+        pfsql.createtable(cache, "dirlist", ["id INTEGER PRIMARY KEY", "path"])
+        cache[1].execute(
+            "INSERT INTO dirlist (path)"
+            + " SELECT DISTINCT path FROM listing.dirlist ORDER BY path"
+        )
+        pfsql.createindex(cache, "pfs_dirlist_path", "dirlist", ["path", "id"])
+
+        pfsql.createtable(
+            cache, "filelist", ["id INTEGER PRIMARY KEY", "path INTEGER"] + colNames
+        )
+        cache[1].execute(
+            f"INSERT INTO filelist (path, {fileCols})"
+            + f" SELECT d.id, {', '.join('f.' + c for c in colNames)}"
+            + " FROM listing.filelist AS f"
+            + " INNER JOIN listing.dirlist AS l ON l.id = f.path"
+            + " INNER JOIN dirlist AS d ON d.path = l.path"
+            + " ORDER BY d.id, f.filename"
+        )
+        pfsql.createindex(cache, "pfs_filelist_path", "filelist", ["path", "filename"])
+
+        pfsql.createtable(cache, "meta", ["key PRIMARY KEY", "value"])
+        pfsql.insertrow(cache, "meta", "?, ?", ("key", cacheKey))
+        pfsql.insertrow(cache, "meta", "?, ?", ("listing", str(dbfilename)))
+        cache[0].commit()
+        pfsql.detachdb(cache, "listing")
+        cache[1].execute("ANALYZE")
+        cache[0].commit()
+    except Exception:
+        pfsql.closedb(cache)
+        tempPath.unlink(missing_ok=True)
+        raise
+    pfsql.closedb(cache)
+
+    # replace an outdated cache file at once
+    os.replace(tempPath, cachePath)
+
+
+def evictcaches(cacheDir, maxSize, keepPaths=()):
+    """Delete the least recently used cache files in cacheDir until their total
+    size is at most maxSize bytes, keeping the files in keepPaths. Return the
+    number of files deleted.
+    """
+    cacheFiles = []
+    for cachePath in pathlib.Path(cacheDir).glob("*" + CACHE_SUFFIX):
+        try:
+            stat = cachePath.stat()
+        except OSError:
+            continue
+        cacheFiles.append((stat.st_mtime, stat.st_size, cachePath))
+
+    totalSize = sum(size for _, size, _ in cacheFiles)
+    keepPaths = {pathlib.Path(p).resolve() for p in keepPaths}
+    deleteCount = 0
+    for _, size, cachePath in sorted(cacheFiles, key=lambda c: c[0]):
+        if totalSize <= maxSize:
+            break
+        if cachePath.resolve() in keepPaths:
+            continue
+        try:
+            cachePath.unlink()
+        except OSError:
+            continue
+        totalSize -= size
+        deleteCount += 1
+    return deleteCount
+
+
+def getpreparedlisting(dbfilename, cacheDir=None):
+    """Return the path of the prepared copy of a listing database file, building
+    the cache file if missing or outdated. In cacheDir, its modification time is
+    updated on each use for evictcaches. Return a tuple (cache path, true if
+    built).
+    """
+    cachePath = getcachepath(dbfilename, cacheDir)
+    cacheKey = getcachekey(dbfilename)
+    if isvalidcache(cachePath, cacheKey):
+        if cacheDir is not None:
+            # mark as recently used
+            os.utime(cachePath)
+        return cachePath, False
+
+    if cacheDir is not None:
+        pathlib.Path(cacheDir).mkdir(parents=True, exist_ok=True)
+    buildcache(dbfilename, cachePath, cacheKey)
+    return cachePath, True
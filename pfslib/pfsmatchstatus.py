@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Class PFSMatchStatus stores the match status of files found in one or both
+databases compared, and counts files per match status.
+"""
+
+# standard imports
+from array import array
+
+
+class PFSMatchStatus:
+    """Class PFSMatchStatus counts the match status of files (0=common, 1=lonely,
+    2=extra) as they are classified. If keepKeys is true, the status of each file
+    is stored as well for later lookup, in one dictionary of filenames per
+    directory path, so the path is stored once per directory instead of in a
+    joined key per file. If countDirs is true, the files are also counted per
+    directory path and match status, along with the common files differing.
+    """
+
+    def __init__(self, keepKeys=False, countDirs=False):
+        self._keepKeys = keepKeys
+        self._dirs = {}
+        self._counts = array("q", [0, 0, 0])
+        self._countDirs = countDirs
+        self._dirCounts = {}
+
+    def getCounts(self, doc="Return the number of common, lonely and extra files"):
+        return tuple(self._counts)
+
+    Counts = property(getCounts)
+
+    def getFileCount(self, doc="Return the number of files classified"):
+        return sum(self._counts)
+
+    FileCount = property(getFileCount)
+
+    def getDirCounts(
+        self, doc="Return (ncommon, nlonely, nextra, ndifferent) per directory path"
+    ):
+        return {path: tuple(counts) for path, counts in self._dirCounts.items()}
+
+    DirCounts = property(getDirCounts)
+
+    def setStatus(self, path, filename, matchStatus):
+        """Count a file classified with matchStatus and store its status
+        if keys are kept.
+        """
+        self._counts[matchStatus] += 1
+
+        if self._countDirs:
+            self.getDirCountsOf(path)[matchStatus] += 1
+
+        if not self._keepKeys:
+            return
+
+        fileStatus = self._dirs.get(path)
+        if fileStatus is None:
+            fileStatus = self._dirs[path] = {}
+        fileStatus[filename] = matchStatus
+
+    def addCount(self, matchStatus, fileCount):
+        """Count a number of files classified with matchStatus in bulk
+        (without storing their status).
+        """
+        self._counts[matchStatus] += fileCount
+
+    def addDiffering(self, path):
+        """Count a common file differing in the directory path if directories
+        are counted.
+        """
+        if self._countDirs:
+            self.getDirCountsOf(path)[3] += 1
+
+    def addDirCounts(self, dirCounts):
+        """Add the directory counts of another PFSMatchStatus (see DirCounts)."""
+        for path, counts in dirCounts.items():
+            dirCountsOf = self.getDirCountsOf(path)
+            for index, count in enumerate(counts):
+                dirCountsOf[index] += count
+
+    def getDirCountsOf(self, path):
+        """Return the array of counts of a directory, created when first used."""
+        counts = self._dirCounts.get(path)
+        if counts is None:
+            counts = self._dirCounts[path] = array("q", [0, 0, 0, 0])
+        return counts
+
+    def getStatus(self, path, filename):
+        """Return the stored match status of a file or None if it is unknown."""
+        fileStatus = self._dirs.get(path)
+        return fileStatus.get(filename) if fileStatus is not None else None
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Module with a merge walk over sorted row iterables (e.g. SQLite cursors).
+"""
+
+
+def mergewalk(iterables, key):
+    """Walk several iterables which are each sorted ascending by key(row) in
+    parallel, and yield a tuple (key, rows) for every distinct key in ascending
+    order. rows is a list holding the row of each iterable for that key,
+    or None where an iterable does not contain the key.
+    Only the current row of each iterable is kept in memory.
+    """
+    iterators = [iter(i) for i in iterables]
+    heads = [next(it, None) for it in iterators]
+    keys = [key(h) if h is not None else None for h in heads]
+
+    while True:
+        try:
+            minKey = min(k for k in keys if k is not None)
+        except ValueError:
+            # all iterables exhausted
+            return
+
+        rows = []
+        for i, k in enumerate(keys):
+            if k == minKey:
+                rows.append(heads[i])
+                heads[i] = next(iterators[i], None)
+                keys[i] = key(heads[i]) if heads[i] is not None else None
+            else:
+                rows.append(None)
+
+        yield minKey, rows
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/17/2023"
+
+"""Module with functions detecting moved and renamed files among the lonely and
+extra files of a comparison, pairing them by a signature of their attributes
+with a hash join.
+"""
+
+# match status of a file found at another path (same filename)
+MOVED = 3
+
+# match status of a file found with another filename
+RENAMED = 4
+
+# names of columns holding a content hash, used as signature if present
+HASH_COLUMN_NAMES = ("hash", "md5", "sha1", "sha256", "xxhash", "crc32")
+
+
+def getsignatureindices(commonColNames):
+    """Return the indices of the row items forming the signature of a file:
+    the size and a content hash column if present, otherwise all compared
+    attribute columns (e.g. size, mtime, ctime).
+    """
+    attrColNames = commonColNames[2:]
+    hashColNames = [c for c in attrColNames if c.lower() in HASH_COLUMN_NAMES]
+    if len(hashColNames) > 0:
+        attrColNames = [c for c in attrColNames if c == "size"] + hashColNames[:1]
+    # row items: dirlist.path followed by the common columns
+    return [commonColNames.index(c) + 1 for c in attrColNames]
+
+
+def pairrows(lonelyRows, extraRows, getKey, unique):
+    """Pair lonely and extra rows with the same key by a hash join. Rows whose
+    key is None are not paired. If unique is true, only keys found in exactly
+    one lonely and one extra row are paired, otherwise the rows of a key are
+    paired in their order. Return a tuple (pairs, lonelyRows, extraRows) with
+    the list of (lonelyRow, extraRow) pairs and the rows left unpaired.
+    """
+    lonelyByKey = {}
+    for index, row in enumerate(lonelyRows):
+        key = getKey(row)
+        if key is not None:
+            lonelyByKey.setdefault(key, []).append(index)
+    # reversed to pair the rows of a key in order by popping from the end
+    for indices in lonelyByKey.values():
+        indices.reverse()
+
+    if unique:
+        extraCounts = {}
+        for row in extraRows:
+            key = getKey(row)
+            if key in lonelyByKey:
+                extraCounts[key] = extraCounts.get(key, 0) + 1
+        lonelyByKey = {
+            key: indices
+            for key, indices in lonelyByKey.items()
+            if len(indices) == 1 and extraCounts.get(key) == 1
+        }
+
+    pairs = []
+    pairedLonely = set()
+    unpairedExtra = []
+    for row in extraRows:
+        indices = lonelyByKey.get(getKey(row))
+        if not indices:
+            unpairedExtra.append(row)
+            continue
+        index = indices.pop()
+        pairedLonely.add(index)
+        pairs.append((lonelyRows[index], row))
+
+    unpairedLonely = [
+        row for index, row in enumerate(lonelyRows) if index not in pairedLonely
+    ]
+    return pairs, unpairedLonely, unpairedExtra
+
+
+def matchmoves(lonelyRows, extraRows, signatureIndices):
+    """Find moved and renamed files among lonely (source only) and extra
+    (target only) rows, each row being dirlist.path followed by the common
+    filelist columns. Files with the same filename and signature are moved,
+    remaining files with the same signature are renamed if the signature is
+    unique on both sides. Return a tuple (moves, lonelyRows, extraRows) with a
+    list of (lonelyRow, extraRow, matchStatus) tuples sorted by source path and
+    the rows left unpaired.
+    """
+
+    def getSignature(row):
+        signature = tuple(row[i] for i in signatureIndices)
+        return None if None in signature else signature
+
+    def getMoveKey(row):
+        signature = getSignature(row)
+        return None if signature is None else (row[2],) + signature
+
+    movedPairs, lonelyRows, extraRows = pairrows(
+        lonelyRows, extraRows, getMoveKey, False
+    )
+    renamedPairs, lonelyRows, extraRows = pairrows(
+        lonelyRows, extraRows, getSignature, True
+    )
+
+    moves = [(s, t, MOVED) for s, t in movedPairs]
+    moves += [(s, t, RENAMED) for s, t in renamedPairs]
+    moves.sort(key=lambda move: (move[0][0], move[0][2]))
+    return moves, lonelyRows, extraRows
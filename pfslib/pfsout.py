@@ -11,10 +11,86 @@ __date__ = "07/16/2023"
 
 # standard imports
 import csv
+import gzip
+import io
+import sys
+import time
+from datetime import datetime
+
+# local imports
+import pfslib.pfscompare as pfscompare
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# number of rows written between checks whether the flush interval elapsed
+FLUSH_CHECK_ROWS = 1000
+
+# names of the result statistics in the order of PFSRun.getResultStats
+STATS_NAMES = ("nfiles", "ncommon", "nlonely", "nextra", "nsame", "ndifferent")
+
+# names of the file counts of a directory summary
+SUMMARY_NAMES = STATS_NAMES[1:]
+
+
+def getstats(params):
+    """Return a dictionary with the statistics of a comparison run like a row of
+    the SQLite stats table, with result counts and duration not set yet.
+    """
+    stats = {
+        "timestamp": str(datetime.now()),
+        "source": str(params.SourceDB),
+        "target": str(params.TargetDB),
+    }
+    stats.update((name, None) for name in STATS_NAMES)
+    stats["duration"] = None
+    return stats
+
+
+def updatestats(stats, resultStats, duration):
+    """Set result counts and duration in a statistics dictionary."""
+    stats.update(zip(STATS_NAMES, resultStats))
+    stats["duration"] = duration
+
+
+def getcomparesigns(differences, sourceRow, targetRow):
+    """Return a list with one value per compared column of a file's rows:
+    0 if the values are the same, 1 if the source value is greater and -1 if
+    the target value is greater.
+    """
+    signs = []
+    for i in range(3, len(sourceRow)):
+        if (i - 1) in differences:
+            signs.append(pfscompare.comparevalues(sourceRow[i], targetRow[i]))
+        else:
+            signs.append(0)
+    return signs
+
+
+def getbatchsigns(rows, signs):
+    """Return the comparison signs of a batch of compare rows as list of lists.
+    signs are computed from the rows if None, NumPy arrays are converted.
+    """
+    if signs is None:
+        return [
+            getcomparesigns(differences, sourceRow, targetRow)
+            for _, _, differences, sourceRow, targetRow in rows
+        ]
+    if hasattr(signs, "tolist"):
+        return signs.tolist()
+    return signs
 
 
 class PFSOut:
-    """Abstract base class for result output."""
+    """Abstract base class for result output. Results are written in batches:
+    writeMatches takes a list of (filePath, fileName, matchStatus) tuples and
+    writeCompares a list of (filePath, fileName, differences, sourceRow,
+    targetRow) tuples, optionally with the comparison signs of each row
+    (see pfscompare). The per-row methods writeMatch and writeCompare pass a
+    batch of one row.
+    """
 
     def __init__(self, commonColNames):
         self._commonColNames = commonColNames
@@ -22,72 +98,209 @@ class PFSOut:
     def openout(self, mode):
         pass
 
+    def writeStats(self, params):
+        """Start the statistics of a comparison run (if supported)."""
+        pass
+
     def writeMatch(self, filePath, fileName, matchStatus):
+        self.writeMatches([(filePath, fileName, matchStatus)])
+
+    def writeMatches(self, rows):
         pass
 
     def flushMatches(self):
         pass
 
     def writeCompare(self, filePath, fileName, differences, sourceRow, targetRow):
+        self.writeCompares([(filePath, fileName, differences, sourceRow, targetRow)])
+
+    def writeCompares(self, rows, signs=None):
         pass
 
     def flushCompares(self):
         pass
 
+    def writeDirMatch(self, dirPath, matchStatus, fileCount):
+        """Write a result for a whole directory sub-tree with fileCount files
+        which all have the same match status (common files being the same).
+        """
+        pass
+
+    def writeDirSummaries(self, rows):
+        """Write the file counts of directories, given as list of tuples
+        (dirPath, ncommon, nlonely, nextra, nsame, ndifferent). nsame and
+        ndifferent are None if no columns are compared.
+        """
+        pass
+
+    def writeMoves(self, rows):
+        """Write files found at another path in the target, given as list of
+        tuples (filePath, fileName, targetPath, targetFileName, matchStatus) with
+        matchStatus 3 (moved) or 4 (renamed). By default each is written as
+        match result of the source file followed by one of the target file.
+        """
+        matchRows = []
+        for filePath, fileName, targetPath, targetFileName, matchStatus in rows:
+            matchRows.append((filePath, fileName, matchStatus))
+            matchRows.append((targetPath, targetFileName, matchStatus))
+        self.writeMatches(matchRows)
+
+    def removeResults(self, dirPaths):
+        """Remove the stored file results of the given directories, or all if
+        dirPaths is None, before an incremental run (if supported).
+        """
+        pass
+
+    def writeDirStates(self, rows):
+        """Store the state of all directories for the next incremental run, a
+        list of tuples (dirPath, sourceDigest, targetDigest, ncommon, nlonely,
+        nextra, nsame, ndifferent) (if supported).
+        """
+        pass
+
+    def updateStats(self, resultStats, duration):
+        """Store the result counts and duration of a comparison run
+        (if supported).
+        """
+        pass
+
+    def writeStatsCounts(self, counts):
+        """Store additional counts of a comparison run with its statistics, a
+        dictionary mapping name to value (if supported).
+        """
+        pass
+
+    def writeProfile(self, phases):
+        """Store the profile of a comparison run, a list of tuples (phase,
+        duration, nrows, rowspersec, nstatements, peakrss) (if supported).
+        """
+        pass
+
+    def finish(self):
+        """Complete the outfile before the profile is stored and the outfile is
+        closed, e.g. build indexes (if needed).
+        """
+        pass
+
     def close(self):
         pass
 
 
 class PFSOutStd(PFSOut):
-    """Class for result output to stdout."""
+    """Class for result output to stdout. The lines of a batch are written
+    with a single call.
+    """
 
     def __init__(self, commonColNames):
         super().__init__(commonColNames)
         self._currentFolder = None
 
-    def writeMatch(self, filePath, fileName, matchStatus):
-        """Print file data to stdout. If file is from next folder first print the
-        folder name in a separate line.
+    def appendFolder(self, lines, filePath):
+        """If file is from next folder first append the folder name
+        as a separate line.
         """
         if not filePath == self._currentFolder:
             self._currentFolder = filePath
-            print(self._currentFolder + "\\")
+            lines.append(self._currentFolder + "\\\n")
+
+    def writeMatches(self, rows):
+        """Print file data to stdout."""
+        lines = []
+        for filePath, fileName, matchStatus in rows:
+            self.appendFolder(lines, filePath)
+
+            if matchStatus == 1:
+                lines.append(f"\t{fileName} ...lonely!\n")
+            elif matchStatus == 2:
+                lines.append(f"\t{fileName} ...extra!\n")
+            elif matchStatus == 6:
+                lines.append(f"\t{fileName} ...changed on source\n")
+            elif matchStatus == 7:
+                lines.append(f"\t{fileName} ...changed on target\n")
+            elif matchStatus == 8:
+                lines.append(f"\t{fileName} ...conflict!\n")
+            else:
+                lines.append(f"\t{fileName}\n")
+
+        sys.stdout.write("".join(lines))
+
+    def writeCompares(self, rows, signs=None):
+        lines = []
+        for filePath, fileName, differences, sourceRow, targetRow in rows:
+            self.appendFolder(lines, filePath)
+
+            if len(differences) == 0:
+                lines.append(f"\t{fileName} ...same\n")
+                continue
+
+            lines.append(f"\t{fileName} ...different:\n")
+            for d in differences:
+                if not self._commonColNames[d].find("time") == -1:
+                    maxLen = 19
+                else:
+                    maxLen = 16
+
+                srFormatted = str(sourceRow[d + 1])
+                srFormatted = srFormatted[: min(maxLen, len(srFormatted))].ljust(
+                    19, "."
+                )
+                trFormatted = str(targetRow[d + 1])
+                trFormatted = trFormatted[: min(maxLen, len(trFormatted))].ljust(
+                    19, "."
+                )
+
+                lines.append(
+                    "\t\t@{0}\t{1} -> {2}\n".format(
+                        self._commonColNames[d], srFormatted, trFormatted
+                    )
+                )
+
+        sys.stdout.write("".join(lines))
 
-        print("\t" + fileName, end="")
+    def writeDirMatch(self, dirPath, matchStatus, fileCount):
+        """Print the sub-tree result in a separate line."""
+        self._currentFolder = None
 
         if matchStatus == 1:
-            print(" ...lonely!")
+            status = "lonely!"
         elif matchStatus == 2:
-            print(" ...extra!")
+            status = "extra!"
         else:
-            print("")
+            status = "same"
 
-    def writeCompare(self, filePath, fileName, differences, sourceRow, targetRow):
-        if not filePath == self._currentFolder:
-            self._currentFolder = filePath
-            print(self._currentFolder + "\\")
+        print(f"{dirPath}\\* ...{status} ({fileCount} files)")
 
-        if len(differences) == 0:
-            print(f"\t{fileName} ...same")
-            return
+    def writeMoves(self, rows):
+        """Print moved and renamed files with their target path."""
+        lines = []
+        for filePath, fileName, targetPath, targetFileName, matchStatus in rows:
+            self.appendFolder(lines, filePath)
 
-        print(f"\t{fileName} ...different:")
-        for d in differences:
-            if not self._commonColNames[d].find("time") == -1:
-                maxLen = 19
-            else:
-                maxLen = 16
+            status = "moved" if matchStatus == 3 else "renamed"
+            lines.append(
+                f"\t{fileName} ...{status} to {targetPath}\\{targetFileName}\n"
+            )
+
+        sys.stdout.write("".join(lines))
 
-            srFormatted = str(sourceRow[d + 1])
-            srFormatted = srFormatted[: min(maxLen, len(srFormatted))].ljust(19, ".")
-            trFormatted = str(targetRow[d + 1])
-            trFormatted = trFormatted[: min(maxLen, len(trFormatted))].ljust(19, ".")
+    def writeDirSummaries(self, rows):
+        """Print the file counts of each directory in a separate line."""
+        self._currentFolder = None
 
-            print(
-                "\t\t@{0}\t{1} -> {2}".format(
-                    self._commonColNames[d], srFormatted, trFormatted
+        lines = []
+        for dirPath, ncommon, nlonely, nextra, nsame, ndifferent in rows:
+            if nsame is None:
+                lines.append(
+                    f"{dirPath}\\ ...{ncommon} common, {nlonely} lonely,"
+                    + f" {nextra} extra\n"
+                )
+            else:
+                lines.append(
+                    f"{dirPath}\\ ...{ncommon} common ({nsame} same,"
+                    + f" {ndifferent} different), {nlonely} lonely, {nextra} extra\n"
                 )
-            )
+
+        sys.stdout.write("".join(lines))
 
 
 class PFSOutFile(PFSOut):
@@ -98,44 +311,136 @@ class PFSOutFile(PFSOut):
         self._filePath = filePath
 
 
-class PFSOutCSV(PFSOutFile):
-    """Class for result output to CSV file."""
+class PFSOutTextFile(PFSOutFile):
+    """Class for result output to a text file. Output is buffered with bufferSize
+    bytes and flushed at least every flushInterval seconds (0=only when buffer is
+    full). Files ending with '.gz' are gzip compressed, files ending with '.zst'
+    are zstd compressed (requires package zstandard).
+    """
 
-    def __init__(self, filePath, commonColNames):
+    def __init__(self, filePath, commonColNames, bufferSize=1 << 20, flushInterval=1.0):
         super().__init__(filePath, commonColNames)
         self._outFile = None
+        self._bufferSize = bufferSize
+        self._flushInterval = flushInterval
+        self._rowsUntilCheck = FLUSH_CHECK_ROWS
+        self._nextFlushTime = 0.0
+
+    def openoutfile(self, mode):
+        """Open the outfile as text stream, compressing if selected by suffix."""
+        self._nextFlushTime = time.monotonic() + self._flushInterval
+        suffix = self._filePath.suffix.lower()
+        if suffix == ".gz":
+            rawFile = gzip.open(self._filePath, mode + "b")
+        elif suffix == ".zst":
+            if zstandard is None:
+                raise ValueError("Package zstandard required for '.zst' outfile!")
+            rawFile = zstandard.ZstdCompressor().stream_writer(
+                open(self._filePath, mode + "b")
+            )
+        else:
+            return open(self._filePath, mode, newline="", buffering=self._bufferSize)
 
-    def openout(self, mode):
-        self._outFile = open(self._filePath, mode, newline="")
-        self._csvWriter = csv.writer(self._outFile, dialect="excel-tab", delimiter=";")
-        columnHeader = ["path", "filename", "match"]
-        if len(self._commonColNames) > 0:
-            columnHeader.extend(self._commonColNames[2:])
-        self._csvWriter.writerow(columnHeader)
+        return io.TextIOWrapper(
+            io.BufferedWriter(rawFile, buffer_size=self._bufferSize), newline=""
+        )
 
-    def writeMatch(self, filePath, fileName, matchStatus):
-        """Write result data as a new line into CSV file."""
-        try:
-            self._csvWriter.writerow([filePath, fileName, matchStatus])
-        except (Exception):
-            # handle invalid chars or invalidly encoded chars
-            self._csvWriter.writerow(["Error in output encoding!"])
+    def checkFlush(self, rowCount=1):
+        """Flush the outfile if the flush interval elapsed. Time is only checked
+        every FLUSH_CHECK_ROWS rows.
+        """
+        self._rowsUntilCheck -= rowCount
+        if self._rowsUntilCheck > 0 or self._flushInterval <= 0:
+            return
+
+        self._rowsUntilCheck = FLUSH_CHECK_ROWS
+        now = time.monotonic()
+        if now >= self._nextFlushTime:
+            self._outFile.flush()
+            self._nextFlushTime = now + self._flushInterval
+
+    def flushMatches(self):
         self._outFile.flush()
 
-    def writeCompare(self, filePath, fileName, differences, sourceRow, targetRow):
-        try:
-            rowItems = [filePath, fileName, 0]
-            for i in range(3, len(sourceRow)):
-                if (i - 1) in differences:
-                    rowItems.append("1" if sourceRow[i] > targetRow[i] else "-1")
-                else:
-                    rowItems.append("0")
-            self._csvWriter.writerow(rowItems)
-        except (Exception):
-            # handle invalid chars or invalidly encoded chars
-            self._csvWriter.writerow(["Error in output encoding!"])
+    def flushCompares(self):
         self._outFile.flush()
 
     def close(self):
         if self._outFile is not None:
             self._outFile.close()
+
+
+class PFSOutCSV(PFSOutTextFile):
+    """Class for result output to CSV file. If summaryByDir is true, the columns
+    are path and the file counts of directory summaries. Otherwise the last
+    column nfiles holds the number of files of sub-tree results and is left out
+    in file results.
+    """
+
+    def __init__(
+        self,
+        filePath,
+        commonColNames,
+        bufferSize=1 << 20,
+        flushInterval=1.0,
+        summaryByDir=False,
+    ):
+        super().__init__(filePath, commonColNames, bufferSize, flushInterval)
+        self._summaryByDir = summaryByDir
+
+    def openout(self, mode):
+        self._outFile = self.openoutfile(mode)
+        self._csvWriter = csv.writer(self._outFile, dialect="excel-tab", delimiter=";")
+        # batches are formatted into a string buffer first
+        self._rowBuffer = io.StringIO(newline="")
+        self._bufferWriter = csv.writer(
+            self._rowBuffer, dialect="excel-tab", delimiter=";"
+        )
+        if self._summaryByDir:
+            columnHeader = ["path"] + list(SUMMARY_NAMES)
+        else:
+            columnHeader = ["path", "filename", "match"]
+            if len(self._commonColNames) > 0:
+                columnHeader.extend(self._commonColNames[2:])
+            columnHeader.append("nfiles")
+        self._csvWriter.writerow(columnHeader)
+
+    def writeRows(self, rows):
+        """Write rows as new lines into CSV file with a single write. If the
+        batch cannot be written, write it row by row replacing invalid rows.
+        """
+        self._rowBuffer.seek(0)
+        self._rowBuffer.truncate()
+        try:
+            self._bufferWriter.writerows(rows)
+            self._outFile.write(self._rowBuffer.getvalue())
+        except (Exception):
+            for row in rows:
+                try:
+                    self._csvWriter.writerow(row)
+                except (Exception):
+                    # handle invalid chars or invalidly encoded chars
+                    self._csvWriter.writerow(["Error in output encoding!"])
+        self.checkFlush(len(rows))
+
+    def writeMatches(self, rows):
+        """Write result data as new lines into CSV file."""
+        self.writeRows(rows)
+
+    def writeCompares(self, rows, signs=None):
+        self.writeRows(
+            [
+                [row[0], row[1], 0] + rowSigns
+                for row, rowSigns in zip(rows, getbatchsigns(rows, signs))
+            ]
+        )
+
+    def writeDirMatch(self, dirPath, matchStatus, fileCount):
+        """Write sub-tree result as a new line with filename '*' and the number
+        of files in the sub-tree into CSV file.
+        """
+        attrValues = [""] * max(len(self._commonColNames) - 2, 0)
+        self.writeRows([[dirPath, "*", matchStatus] + attrValues + [fileCount]])
+
+    def writeDirSummaries(self, rows):
+        self.writeRows(rows)
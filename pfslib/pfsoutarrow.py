@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Class handles output of file comparison results to an Arrow IPC or Parquet
+file (requires package pyarrow).
+"""
+
+# standard imports
+import json
+
+# local imports
+import pfslib.pfsout as pfsout
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# number of result rows per record batch (Parquet: row group)
+RECORD_BATCH_ROWS = 64 * 1024
+
+# metadata key of the run statistics
+STATS_KEY = "pfs.stats"
+
+
+class PFSOutArrow(pfsout.PFSOutFile):
+    """Class handles output of file comparison results in columnar format, written
+    in record batches of RECORD_BATCH_ROWS rows: an Arrow IPC file or a Parquet
+    file if parquet is true. Columns are path, filename, match, the compared
+    columns (NULL except for common files) and nfiles, the number of files of
+    sub-tree results (NULL otherwise), which have filename '*'.
+    The statistics of the run (the columns of the SQLite stats table) are stored
+    as JSON in the metadata key 'pfs.stats': for Parquet in the file metadata,
+    for Arrow IPC in the custom metadata of the last (empty) record batch.
+    If summaryByDir is true, the columns are path and the file counts of
+    directory summaries.
+    """
+
+    def __init__(self, filePath, commonColNames, parquet=False, summaryByDir=False):
+        if pyarrow is None:
+            raise ValueError("Package pyarrow required for Arrow or Parquet outfile!")
+
+        super().__init__(filePath, commonColNames)
+        self._parquet = parquet
+        self._attrColNames = commonColNames[2:]
+        if summaryByDir:
+            self._schema = pyarrow.schema(
+                [("path", pyarrow.string())]
+                + [(c, pyarrow.int64()) for c in pfsout.SUMMARY_NAMES]
+            )
+        else:
+            self._schema = pyarrow.schema(
+                [("path", pyarrow.string()), ("filename", pyarrow.string())]
+                + [("match", pyarrow.int8())]
+                + [(c, pyarrow.int8()) for c in self._attrColNames]
+                + [("nfiles", pyarrow.int64())]
+            )
+        self._writer = None
+        self._stats = None
+        self.resetColumns()
+
+    def resetColumns(self):
+        self._columns = [[] for _ in self._schema]
+
+    def openout(self, mode):
+        if mode != "w":
+            raise ValueError("Arrow or Parquet outfile cannot be updated!")
+
+        if self._parquet:
+            self._writer = pyarrow.parquet.ParquetWriter(
+                str(self._filePath), self._schema
+            )
+        else:
+            self._writer = pyarrow.ipc.new_file(str(self._filePath), self._schema)
+
+    def writeStats(self, params):
+        self._stats = pfsout.getstats(params)
+
+    def appendRow(self, row):
+        """Append a row to the buffered columns, missing values are NULL."""
+        for i, column in enumerate(self._columns):
+            column.append(row[i] if i < len(row) else None)
+
+    def checkBatch(self):
+        if len(self._columns[0]) >= RECORD_BATCH_ROWS:
+            self.writeBatch()
+
+    def writeBatch(self):
+        """Write the buffered rows as record batch."""
+        if len(self._columns[0]) == 0:
+            return
+
+        try:
+            batch = pyarrow.record_batch(self._columns, schema=self._schema)
+        except UnicodeEncodeError:
+            # replace invalid chars or invalidly encoded chars
+            for field, column in zip(self._schema, self._columns):
+                if field.type == pyarrow.string():
+                    column[:] = [v.encode("utf-8", "replace").decode() for v in column]
+            batch = pyarrow.record_batch(self._columns, schema=self._schema)
+        self.resetColumns()
+        self._writer.write_batch(batch)
+
+    def writeMatches(self, rows):
+        for row in rows:
+            # compared columns are NULL
+            self.appendRow(row)
+        self.checkBatch()
+
+    def writeCompares(self, rows, signs=None):
+        for row, rowSigns in zip(rows, pfsout.getbatchsigns(rows, signs)):
+            self.appendRow([row[0], row[1], 0] + rowSigns)
+        self.checkBatch()
+
+    def writeDirMatch(self, dirPath, matchStatus, fileCount):
+        attrValues = [None] * len(self._attrColNames)
+        self.appendRow([dirPath, "*", matchStatus] + attrValues + [fileCount])
+        self.checkBatch()
+
+    def writeDirSummaries(self, rows):
+        for row in rows:
+            self.appendRow(row)
+        self.checkBatch()
+
+    def updateStats(self, resultStats, duration):
+        pfsout.updatestats(self._stats, resultStats, duration)
+
+    def writeStatsCounts(self, counts):
+        self._stats.update(counts)
+
+    def close(self):
+        """Write remaining rows and statistics and close the outfile."""
+        if self._writer is None:
+            return
+
+        try:
+            self.writeBatch()
+            if self._stats is not None:
+                metadata = {STATS_KEY: json.dumps(self._stats)}
+                if self._parquet:
+                    self._writer.add_key_value_metadata(metadata)
+                else:
+                    self._writer.write_batch(
+                        pyarrow.record_batch(self._columns, schema=self._schema),
+                        custom_metadata=metadata,
+                    )
+        finally:
+            self._writer.close()
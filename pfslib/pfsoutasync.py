@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Class PFSOutAsync runs another output object on a background thread,
+decoupling result output from the comparison loop.
+"""
+
+# standard imports
+import queue
+import threading
+import time
+
+# local imports
+import pfslib.pfsout as pfsout
+
+# number of result rows passed to the writer thread at once
+CHUNK_SIZE = 256
+
+
+class PFSOutAsync(pfsout.PFSOut):
+    """Class PFSOutAsync forwards all output calls to a wrapped output object, which
+    executes them in order on a writer thread. Calls are passed in chunks of about
+    CHUNK_SIZE result rows through a bounded queue of queueSize chunks. An exception
+    raised by the wrapped object is re-raised once in the calling thread with a
+    following output call, further calls except close are skipped then. Flush
+    methods wait until all calls before were executed.
+    """
+
+    def __init__(self, out, queueSize):
+        super().__init__(out._commonColNames)
+        self._out = out
+        self._queue = queue.Queue(maxsize=queueSize)
+        self._chunk = []
+        self._chunkRows = 0
+        self._error = None
+        self._errorRaised = False
+        self._blockedPuts = 0
+        self._blockedTime = 0.0
+        self._thread = threading.Thread(
+            target=self.writeChunks, name="PFSOutAsync", daemon=True
+        )
+        self._thread.start()
+
+    def getBlockedPuts(
+        self, doc="Return how often the comparison waited for a full queue"
+    ):
+        return self._blockedPuts
+
+    BlockedPuts = property(getBlockedPuts)
+
+    def getBlockedTime(
+        self, doc="Return the time in seconds the comparison waited for the queue"
+    ):
+        return self._blockedTime
+
+    BlockedTime = property(getBlockedTime)
+
+    def writeChunks(self):
+        """Execute the queued output calls (run by the writer thread)."""
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                self._queue.task_done()
+                return
+
+            for method, args in chunk:
+                # after an error keep draining the queue without writing,
+                # so the comparison does not block
+                if self._error is not None and method != "close":
+                    continue
+                try:
+                    getattr(self._out, method)(*args)
+                except Exception as e:
+                    if self._error is None:
+                        self._error = e
+            self._queue.task_done()
+
+    def checkError(self):
+        if self._error is not None and not self._errorRaised:
+            self._errorRaised = True
+            raise self._error
+
+    def putChunk(self):
+        """Pass the current chunk of calls to the writer thread. Count and time
+        waiting if the queue is full (backpressure).
+        """
+        chunk, self._chunk = self._chunk, []
+        self._chunkRows = 0
+        try:
+            self._queue.put_nowait(chunk)
+        except queue.Full:
+            self._blockedPuts += 1
+            startTime = time.perf_counter()
+            self._queue.put(chunk)
+            self._blockedTime += time.perf_counter() - startTime
+
+    def call(self, method, *args, rowCount=1):
+        self._chunk.append((method, args))
+        self._chunkRows += rowCount
+        if self._chunkRows >= CHUNK_SIZE:
+            self.checkError()
+            self.putChunk()
+
+    def sync(self):
+        """Wait until all calls were executed by the writer thread."""
+        if len(self._chunk) > 0:
+            self.putChunk()
+        self._queue.join()
+        self.checkError()
+
+    def openout(self, mode):
+        self.call("openout", mode)
+        self.sync()
+
+    def writeStats(self, params):
+        self.call("writeStats", params)
+
+    def writeMatches(self, rows):
+        self.call("writeMatches", rows, rowCount=len(rows))
+
+    def flushMatches(self):
+        self.call("flushMatches")
+        self.sync()
+
+    def writeCompares(self, rows, signs=None):
+        self.call("writeCompares", rows, signs, rowCount=len(rows))
+
+    def flushCompares(self):
+        self.call("flushCompares")
+        self.sync()
+
+    def writeDirMatch(self, dirPath, matchStatus, fileCount):
+        self.call("writeDirMatch", dirPath, matchStatus, fileCount)
+
+    def writeDirSummaries(self, rows):
+        self.call("writeDirSummaries", rows, rowCount=len(rows))
+
+    def writeMoves(self, rows):
+        self.call("writeMoves", rows, rowCount=len(rows))
+
+    def removeResults(self, dirPaths):
+        self.call("removeResults", dirPaths)
+
+    def writeDirStates(self, rows):
+        self.call("writeDirStates", rows, rowCount=len(rows))
+
+    def updateStats(self, resultStats, duration):
+        self.call("updateStats", resultStats, duration)
+
+    def writeStatsCounts(self, counts):
+        self.call("writeStatsCounts", counts)
+
+    def writeProfile(self, phases):
+        self.call("writeProfile", phases)
+
+    def finish(self):
+        self.call("finish")
+        self.sync()
+
+    def close(self):
+        """Close the wrapped output object and stop the writer thread."""
+        try:
+            self.call("close")
+            self.sync()
+        finally:
+            self._queue.put(None)
+            self._thread.join()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Class handles output of file comparison results to a JSON Lines file.
+"""
+
+# standard imports
+import json
+
+# local imports
+import pfslib.pfsout as pfsout
+
+
+class PFSOutJSONL(pfsout.PFSOutTextFile):
+    """Class handles output of file comparison results as JSON Lines, one object
+    per file with keys path, filename, match and the compared columns (common
+    files only). Sub-tree results have filename '*' and key nfiles, directory
+    summaries have keys path and the file counts. The statistics of the run are
+    written as last line {"stats": {...}} with the columns of the SQLite stats
+    table. Records are streamed, so memory use does not depend on the number of
+    results. Moved and renamed files have keys targetpath and
+    targetfilename.
+    """
+
+    def __init__(self, filePath, commonColNames, bufferSize=1 << 20, flushInterval=1.0):
+        super().__init__(filePath, commonColNames, bufferSize, flushInterval)
+        self._attrColNames = commonColNames[2:]
+        self._stats = None
+        self._encoder = json.JSONEncoder(separators=(",", ":"))
+
+    def openout(self, mode):
+        self._outFile = self.openoutfile(mode)
+
+    def writeStats(self, params):
+        self._stats = pfsout.getstats(params)
+
+    def writeRecords(self, records):
+        """Write records as JSON lines into the outfile with a single write."""
+        encode = self._encoder.encode
+        self._outFile.write("".join(encode(r) + "\n" for r in records))
+        self.checkFlush(len(records))
+
+    def writeMatches(self, rows):
+        self.writeRecords(
+            [
+                {"path": filePath, "filename": fileName, "match": matchStatus}
+                for filePath, fileName, matchStatus in rows
+            ]
+        )
+
+    def writeCompares(self, rows, signs=None):
+        records = []
+        for row, rowSigns in zip(rows, pfsout.getbatchsigns(rows, signs)):
+            record = {"path": row[0], "filename": row[1], "match": 0}
+            record.update(zip(self._attrColNames, rowSigns))
+            records.append(record)
+        self.writeRecords(records)
+
+    def writeDirMatch(self, dirPath, matchStatus, fileCount):
+        record = {"path": dirPath, "filename": "*", "match": matchStatus}
+        record["nfiles"] = fileCount
+        self.writeRecords([record])
+
+    def writeMoves(self, rows):
+        keys = ("path", "filename", "targetpath", "targetfilename", "match")
+        self.writeRecords([dict(zip(keys, row)) for row in rows])
+
+    def writeDirSummaries(self, rows):
+        keys = ("path",) + pfsout.SUMMARY_NAMES
+        self.writeRecords([dict(zip(keys, row)) for row in rows])
+
+    def updateStats(self, resultStats, duration):
+        pfsout.updatestats(self._stats, resultStats, duration)
+
+    def writeStatsCounts(self, counts):
+        self._stats.update(counts)
+
+    def close(self):
+        """Write the statistics line and close the outfile."""
+        if self._outFile is not None and self._stats is not None:
+            self.writeRecords([{"stats": self._stats}])
+        super().close()
@@ -10,18 +10,76 @@ __date__ = "07/16/2023"
 """
 
 # standard imports
+import pathlib
 from datetime import datetime
 
 # local imports
 import pfslib.pfsout as pfsout
 import pfslib.pfsql as pfsql
 
+# columns of table dirstate
+DIRSTATE_COLUMNS = [
+    "path PRIMARY KEY",
+    "sourcedigest BLOB",
+    "targetdigest BLOB",
+] + [c + " INTEGER" for c in pfsout.SUMMARY_NAMES]
+
+
+def readdirstates(dbFileName, source, target):
+    """Return a dictionary mapping directory paths to tuples (sourcedigest,
+    targetdigest, ncommon, nlonely, nextra, nsame, ndifferent) as stored in
+    table dirstate by the last incremental run comparing source with target,
+    or None if the database holds no such state.
+    """
+    if not pathlib.Path(dbFileName).is_file():
+        return None
+
+    db = pfsql.opendb(dbFileName)
+    try:
+        if not pfsql.tableexists(db, "dirstate") or not pfsql.tableexists(
+            db, "stats"
+        ):
+            return None
+        res = db[1].execute(
+            "SELECT source, target FROM stats"
+            + " WHERE id = (SELECT MAX(statsid) FROM dirstate)"
+        )
+        if res.fetchone() != (str(source), str(target)):
+            return None
+
+        columnNames = [c.split()[0] for c in DIRSTATE_COLUMNS]
+        res = db[1].execute(f"SELECT {', '.join(columnNames)} FROM dirstate")
+        return {row[0]: row[1:] for row in res}
+    finally:
+        pfsql.closedb(db)
+
 
 class PFSOutSqlite(pfsout.PFSOutFile):
-    """Class handles output of matching file search results to SQLite database."""
+    """Class handles output of matching file search results to SQLite database.
+    Results are inserted in batches of at least batchSize rows. In bulk mode all rows of
+    a phase (matches or compares) are inserted in a single transaction. Indexes
+    on table filecomp are built after loading when the output is closed.
+    journalMode and synchronous optionally set the respective SQLite pragmas.
+    If incremental is false, a directory state stored by an incremental run is
+    dropped when updating, since further results are appended.
+    """
 
-    def __init__(self, filePath, commonColNames):
+    def __init__(
+        self,
+        filePath,
+        commonColNames,
+        batchSize=1000,
+        bulk=False,
+        journalMode=None,
+        synchronous=None,
+        incremental=False,
+    ):
         super().__init__(filePath, commonColNames)
+        self._batchSize = batchSize
+        self._incremental = incremental
+        self._bulk = bulk
+        self._journalMode = journalMode
+        self._synchronous = synchronous
         self._insertMatchCmd = (
             "INSERT INTO filecomp (path, filename, match) VALUES (?, ?, ?)"
         )
@@ -32,17 +90,37 @@ class PFSOutSqlite(pfsout.PFSOutFile):
     def openout(self, mode):
         self._db = pfsql.opendb(self._filePath)
 
+        if self._journalMode is not None:
+            pfsql.setpragma(self._db, "journal_mode", self._journalMode)
+        if self._synchronous is not None:
+            pfsql.setpragma(self._db, "synchronous", self._synchronous)
+
         if mode == "w":
             self.droptables()
+        elif not self._incremental:
+            pfsql.droptable(self._db, "dirstate", True)
 
         self.setuptables()
 
-        self._dataSets = []
+        if self._bulk:
+            # defer index updates until all rows are loaded
+            self.dropindexes()
+
+        # match and compare datasets are buffered separately
+        # since match engines may write both interleaved
+        self._matchDataSets = []
+        self._compareDataSets = []
 
     def droptables(self):
         try:
             pfsql.droptable(self._db, "stats", True)
             pfsql.droptable(self._db, "filecomp", True)
+            pfsql.droptable(self._db, "dircomp", True)
+            pfsql.droptable(self._db, "dirsummary", True)
+            pfsql.droptable(self._db, "filemove", True)
+            pfsql.droptable(self._db, "dirstate", True)
+            pfsql.droptable(self._db, "profile", True)
+            pfsql.droptable(self._db, "statscounts", True)
         except Exception:
             print("Error while clearing existing data tables (check recommended)!?")
 
@@ -52,7 +130,19 @@ class PFSOutSqlite(pfsout.PFSOutFile):
             columnsWithType = [c + " INTEGER" for c in self._commonColNames[2:]]
             columnHeader.extend(columnsWithType)
 
-        pfsql.createtable(self._db, "filecomp", columnHeader)
+        pfsql.createtable(self._db, "filecomp", columnHeader, True)
+
+    def dropindexes(self):
+        for indexName in ("pfs_filecomp_path", "pfs_filecomp_match"):
+            self._db[1].execute(f"DROP INDEX IF EXISTS {indexName}")
+        self._db[0].commit()
+
+    def createindexes(self):
+        """Create indexes for queries on results by file and by match status."""
+        pfsql.createindex(
+            self._db, "pfs_filecomp_path", "filecomp", ["path", "filename"], True
+        )
+        pfsql.createindex(self._db, "pfs_filecomp_match", "filecomp", ["match"], True)
 
     def writeStats(self, params):
         """Create statistics table if not existing and append a new row."""
@@ -93,39 +183,99 @@ class PFSOutSqlite(pfsout.PFSOutFile):
             ),
         )
 
-    def writeMatch(self, filePath, fileName, matchStatus):
-        if len(self._dataSets) < 50:
-            self._dataSets.append(
-                (
-                    filePath,
-                    fileName,
-                    matchStatus,
-                )
-            )
-        else:
+    def writeMatches(self, rows):
+        self._matchDataSets.extend(rows)
+        if len(self._matchDataSets) >= self._batchSize:
             self.executeInsertMatches()
 
     def flushMatches(self):
-        """Write remaining match datasets to database."""
-        if len(self._dataSets) > 0:
+        """Write remaining match datasets to database and commit."""
+        if len(self._matchDataSets) > 0:
             self.executeInsertMatches()
+        self._db[0].commit()
 
-    def writeCompare(self, filePath, fileName, differences, sourceRow, targetRow):
-        if len(self._dataSets) < 50:
-            rowItems = [filePath, fileName, 0]
-            for i in range(3, len(sourceRow)):
-                if (i - 1) in differences:
-                    rowItems.append(1 if sourceRow[i] > targetRow[i] else -1)
-                else:
-                    rowItems.append(0)
-            self._dataSets.append(rowItems)
-        else:
+    def writeCompares(self, rows, signs=None):
+        self._compareDataSets.extend(
+            [row[0], row[1], 0] + rowSigns
+            for row, rowSigns in zip(rows, pfsout.getbatchsigns(rows, signs))
+        )
+        if len(self._compareDataSets) >= self._batchSize:
             self.executeInsertCompares()
 
     def flushCompares(self):
-        """Write remaining compare datasets to database."""
-        if len(self._dataSets) > 0:
+        """Write remaining compare datasets to database and commit."""
+        if len(self._compareDataSets) > 0:
             self.executeInsertCompares()
+        self._db[0].commit()
+
+    def writeDirMatch(self, dirPath, matchStatus, fileCount):
+        """Insert sub-tree result into table dircomp (created when first used)."""
+        pfsql.createtable(
+            self._db, "dircomp", ["path", "match INTEGER", "nfiles INTEGER"], True
+        )
+        pfsql.insertrow(
+            self._db, "dircomp", "?, ?, ?", (dirPath, matchStatus, fileCount)
+        )
+
+    def writeMoves(self, rows):
+        """Insert moved and renamed files as match results into table
+        filecomp, and the pairs of source and target file into table filemove
+        (created when first used).
+        """
+        super().writeMoves(rows)
+        pfsql.createtable(
+            self._db,
+            "filemove",
+            ["path", "filename", "targetpath", "targetfilename", "match INTEGER"],
+            True,
+        )
+        self.executeInsert("INSERT INTO filemove VALUES (?, ?, ?, ?, ?)", rows)
+
+    def writeDirSummaries(self, rows):
+        """Insert directory file counts into table dirsummary (created when
+        first used).
+        """
+        pfsql.createtable(
+            self._db,
+            "dirsummary",
+            ["path"] + [c + " INTEGER" for c in pfsout.SUMMARY_NAMES],
+            True,
+        )
+        self.executeInsert(
+            f"INSERT INTO dirsummary VALUES ({(6 * '?, ').strip(', ')})", rows
+        )
+
+    def removeResults(self, dirPaths):
+        """Delete the file results of the given directories from table
+        filecomp, or all file results if dirPaths is None. The paths are looked
+        up in a temporary table, so a single pass over filecomp suffices even
+        without its indexes (dropped in bulk mode).
+        """
+        if dirPaths is None:
+            self._db[1].execute("DELETE FROM filecomp")
+        else:
+            pfsql.createtable(self._db, "temp.pfs_removeddirs", ["path PRIMARY KEY"])
+            self._db[1].executemany(
+                "INSERT INTO temp.pfs_removeddirs VALUES (?)", ((p,) for p in dirPaths)
+            )
+            self._db[1].execute(
+                "DELETE FROM filecomp"
+                + " WHERE path IN (SELECT path FROM temp.pfs_removeddirs)"
+            )
+            pfsql.droptable(self._db, "temp.pfs_removeddirs")
+        self._db[0].commit()
+
+    def writeDirStates(self, rows):
+        """Replace table dirstate with the given rows, linked to the statistics
+        row of this run by statsid.
+        """
+        pfsql.droptable(self._db, "dirstate", True)
+        pfsql.createtable(self._db, "dirstate", DIRSTATE_COLUMNS + ["statsid INTEGER"])
+        self._db[1].executemany(
+            f"INSERT INTO dirstate VALUES ({(9 * '?, ').strip(', ')})",
+            (tuple(row) + (self._statrowID,) for row in rows),
+        )
+        self._db[0].commit()
 
     def updateStats(self, resultStats, duration):
         if len(resultStats) < 5:
@@ -161,22 +311,93 @@ class PFSOutSqlite(pfsout.PFSOutFile):
             params,
         )
 
+    def writeStatsCounts(self, counts):
+        """Insert additional counts of the run into table statscounts (created
+        when first used), one row per name linked to the statistics row by
+        statsid.
+        """
+        pfsql.createtable(
+            self._db, "statscounts", ["statsid INTEGER", "name", "value"], True
+        )
+        self._db[1].executemany(
+            "INSERT INTO statscounts VALUES (?, ?, ?)",
+            ((self._statrowID, name, value) for name, value in counts.items()),
+        )
+        self._db[0].commit()
+
+    def writeProfile(self, phases):
+        """Insert the profile of the run into table profile (created when first
+        used), linked to the statistics row by statsid.
+        """
+        pfsql.createtable(
+            self._db,
+            "profile",
+            [
+                "statsid INTEGER",
+                "phase",
+                "duration",
+                "nrows INTEGER",
+                "rowspersec",
+                "nstatements INTEGER",
+                "peakrss INTEGER",
+            ],
+            True,
+        )
+        self._db[1].executemany(
+            "INSERT INTO profile VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((self._statrowID,) + tuple(phase) for phase in phases),
+        )
+        self._db[0].commit()
+
+    def finish(self):
+        """Commit and build indexes."""
+        self._db[0].commit()
+        self.createindexes()
+
     def close(self):
-        """Close database connection."""
-        pfsql.closedb(self._db)
+        """Build indexes (unless done by finish) and close database connection."""
+        try:
+            self._db[0].commit()
+            self.createindexes()
+        finally:
+            pfsql.closedb(self._db)
 
     def executeInsertMatches(self):
-        self.executeInsert(self._insertMatchCmd)
+        self.executeInsert(self._insertMatchCmd, self._matchDataSets)
+        self._matchDataSets = []
 
     def executeInsertCompares(self):
-        self.executeInsert(self._insertCompareCmd)
+        self.executeInsert(self._insertCompareCmd, self._compareDataSets)
+        self._compareDataSets = []
 
-    def executeInsert(self, cmd):
+    def executeInsert(self, cmd, dataSets):
+        """Insert a batch of rows with a single statement. If the batch fails,
+        its rows inserted so far are undone (within the open bulk transaction)
+        and all rows are inserted one by one, skipping invalid rows.
+        """
+        if not self._db[0].in_transaction:
+            # keep the savepoint from committing an open bulk phase on release
+            self._db[1].execute("BEGIN")
+        self._db[1].execute("SAVEPOINT pfs_batch")
         try:
-            self._db[1].executemany(cmd, self._dataSets)
-            self._db[0].commit()
+            self._db[1].executemany(cmd, dataSets)
         except Exception as e:
-            # ignore invalid data
-            print(e)
-            # pass
-        self._dataSets = []
+            self._db[1].execute("ROLLBACK TO pfs_batch")
+            self.executeInsertByRow(cmd, dataSets, e)
+        self._db[1].execute("RELEASE pfs_batch")
+        if not self._bulk:
+            self._db[0].commit()
+
+    def executeInsertByRow(self, cmd, dataSets, batchError):
+        """Insert rows one by one and report the number of invalid rows."""
+        rejectedCount = 0
+        for dataSet in dataSets:
+            try:
+                self._db[1].execute(cmd, dataSet)
+            except Exception:
+                rejectedCount += 1
+        if rejectedCount > 0:
+            print(
+                f"Skipped {rejectedCount} of {len(dataSets)} result rows"
+                + f" with invalid data ({batchError})!"
+            )
@@ -12,8 +12,27 @@ and additional attribute for stdout usage.
 """
 
 # standard imports
+import copy
 import pathlib
 
+# outfile formats by outfile type
+OUTFILE_FORMATS = ("csv", "sqlite", "jsonl", "arrow", "parquet")
+
+# outfile name endings selecting the outfile format (otherwise SQLite)
+CSV_SUFFIXES = (".csv", ".csv.gz", ".csv.zst")
+JSONL_SUFFIXES = (".jsonl", ".jsonl.gz", ".jsonl.zst", ".ndjson")
+ARROW_SUFFIXES = (".arrow", ".arrows", ".feather")
+PARQUET_SUFFIXES = (".parquet",)
+
+
+def gettargetoutfile(outfile, targetNumber):
+    """Return the outfile for the results of target number targetNumber (2 for
+    the first additional target), e.g. 'results-2.csv' for 'results.csv'.
+    """
+    outfile = pathlib.Path(outfile)
+    stem, dot, suffixes = outfile.name.partition(".")
+    return outfile.with_name(f"{stem}-{targetNumber}{dot}{suffixes}")
+
 
 class PFSParams:
     """Class PFSParams defines a set of parameters used for searching files:
@@ -24,19 +43,41 @@ class PFSParams:
     def __init__(self, args):
         self._SourceDB = args.source
         self._TargetDB = args.target
+        self._ExtraTargets = args.extratargets
+        self._BaseDB = args.base
         self._CompareCTime = args.ctime
+        self._MatchEngine = args.engine
+        self._MemCopy = args.memcopy
+        self._UseDigests = args.digest
+        self._UseKeyCache = args.keycache
+        self._CacheDir = args.cachedir if args.keycache else None
+        self._CacheSize = args.cachesize << 20
+        self._CacheDigests = (args.digest or args.incremental) and args.digestcache
+        self._Incremental = args.incremental
+        self._MatchDirsFirst = args.dirsfirst
+        self._WriteDirRecords = args.dirsfirst and args.dirrecords
+        self._DetectMoves = args.moves
+        self._OnlyChanges = args.onlychanges
+        self._SummaryByDir = args.summarybydir
+        self._Jobs = args.jobs
+        self._AsyncOutput = args.asyncoutput
+        self._QueueSize = args.queuesize
+        self._Profile = args.profile
         self._OutFile = args.outfile
         self._UseStdOut = args.outfile is None
         if not self._UseStdOut:
-            self._OutFileType = 0 if str(args.outfile).lower().endswith(".csv") else 1
+            self._OutFileType = self.getOutFileTypeOf(args.outfile, args.outformat)
         else:
             self._OutFileType = None
         self._OutExistsMode = args.overwrite + args.update
-        self._ShowDots = not self._UseStdOut and not args.nodots
-        if self._ShowDots:
-            self._FilesPerDot = pow(10, args.dots)
-        else:
-            self._FilesPerDot = 0
+        self._BatchSize = args.batchsize
+        self._BufferSize = args.buffersize
+        self._FlushInterval = args.flushinterval
+        self._BulkLoad = args.bulk
+        self._JournalMode = args.journalmode
+        self._Synchronous = args.synchronous
+        self._ShowProgress = not self._UseStdOut and not args.noprogress
+        self._ProgressInterval = args.progressinterval
         self.IsValid()
 
     def getSourceDB(self):
@@ -49,11 +90,148 @@ class PFSParams:
 
     TargetDB = property(getTargetDB)
 
+    def getExtraTargets(
+        self, doc="Return the list of additional target databases"
+    ):
+        return self._ExtraTargets
+
+    ExtraTargets = property(getExtraTargets)
+
+    def getBaseDB(
+        self, doc="Return the base database of a three-way comparison or None"
+    ):
+        return self._BaseDB
+
+    BaseDB = property(getBaseDB)
+
+    def getTargetParams(self, index):
+        """Return a copy of the parameters comparing the source with additional
+        target index (0-based), writing to its own outfile.
+        """
+        params = copy.copy(self)
+        params._TargetDB = self._ExtraTargets[index]
+        params._ExtraTargets = []
+        params._OutFile = gettargetoutfile(self._OutFile, index + 2)
+        params.resolveOutFilePath(params._OutFile)
+        return params
+
     def getCompareCTime(self, doc="Compare file creation times"):
         return self._CompareCTime
 
     CompareCTime = property(getCompareCTime)
 
+    def getMatchEngine(self, doc="Return the name of the match engine to use"):
+        return self._MatchEngine
+
+    MatchEngine = property(getMatchEngine)
+
+    def getMemCopy(
+        self,
+        doc="If true/false, databases are (not) copied into memory, None=automatic",
+    ):
+        return self._MemCopy
+
+    MemCopy = property(getMemCopy)
+
+    def getUseDigests(
+        self, doc="If true, skip sub-trees with identical directory digests"
+    ):
+        return self._UseDigests
+
+    UseDigests = property(getUseDigests)
+
+    def getUseKeyCache(
+        self, doc="If true, prepared copies of the databases are read from cache"
+    ):
+        return self._UseKeyCache
+
+    UseKeyCache = property(getUseKeyCache)
+
+    def getCacheDir(
+        self, doc="Return the directory of the key cache files or None (sidecar)"
+    ):
+        return self._CacheDir
+
+    CacheDir = property(getCacheDir)
+
+    def getCacheSize(
+        self, doc="Return the maximum total size of key cache files in bytes"
+    ):
+        return self._CacheSize
+
+    CacheSize = property(getCacheSize)
+
+    def getCacheDigests(
+        self, doc="If true, directory digests are cached next to the databases"
+    ):
+        return self._CacheDigests
+
+    CacheDigests = property(getCacheDigests)
+
+    def getMatchDirsFirst(
+        self, doc="If true, match directories before files in common directories"
+    ):
+        return self._MatchDirsFirst
+
+    MatchDirsFirst = property(getMatchDirsFirst)
+
+    def getWriteDirRecords(
+        self, doc="If true, write one result per sub-tree present on one side only"
+    ):
+        return self._WriteDirRecords
+
+    WriteDirRecords = property(getWriteDirRecords)
+
+    def getIncremental(
+        self, doc="If true, compare only directories changed since the last run"
+    ):
+        return self._Incremental
+
+    Incremental = property(getIncremental)
+
+    def getDetectMoves(
+        self, doc="If true, report lonely and extra files as moved or renamed"
+    ):
+        return self._DetectMoves
+
+    DetectMoves = property(getDetectMoves)
+
+    def getOnlyChanges(
+        self, doc="If true, write lonely, extra and different files only"
+    ):
+        return self._OnlyChanges
+
+    OnlyChanges = property(getOnlyChanges)
+
+    def getSummaryByDir(
+        self, doc="If true, write file counts per directory instead of files"
+    ):
+        return self._SummaryByDir
+
+    SummaryByDir = property(getSummaryByDir)
+
+    def getJobs(self, doc="Return the number of worker processes to use"):
+        return self._Jobs
+
+    Jobs = property(getJobs)
+
+    def getAsyncOutput(self, doc="If true, results are written by a writer thread"):
+        return self._AsyncOutput
+
+    AsyncOutput = property(getAsyncOutput)
+
+    def getQueueSize(self, doc="Return the size of the writer thread queue"):
+        return self._QueueSize
+
+    QueueSize = property(getQueueSize)
+
+    def getProfile(
+        self, doc="If true, print and store timings and counts of each phase"
+    ):
+        return self._Profile
+
+    Profile = property(getProfile)
+
     def getOutFilePath(self, doc="Determines the filename of the output file"):
         return self._OutFilePath
 
@@ -64,11 +242,32 @@ class PFSParams:
 
     UseStdOut = property(getUseStdOut)
 
-    def getOutFileType(self, doc="Return the file type used for output"):
+    def getOutFileType(
+        self,
+        doc="Return the file type used for output:"
+        + " 0=CSV, 1=SQLite, 2=JSON Lines, 3=Arrow IPC, 4=Parquet",
+    ):
         return self._OutFileType
 
     OutFileType = property(getOutFileType)
 
+    @staticmethod
+    def getOutFileTypeOf(outfile, outformat):
+        """Return the outfile type selected by format name or by file name."""
+        if outformat is not None:
+            return OUTFILE_FORMATS.index(outformat)
+
+        outfileName = str(outfile).lower()
+        for outFileType, suffixes in (
+            (0, CSV_SUFFIXES),
+            (2, JSONL_SUFFIXES),
+            (3, ARROW_SUFFIXES),
+            (4, PARQUET_SUFFIXES),
+        ):
+            if outfileName.endswith(suffixes):
+                return outFileType
+        return 1
+
     def getOutExistsMode(
         self, doc="Defines the way an existing outfile will be handled"
     ):
@@ -76,40 +275,178 @@ class PFSParams:
 
     OutExistsMode = property(getOutExistsMode)
 
-    def getShowDots(
+    def getBatchSize(
+        self, doc="Return the number of rows inserted into the outfile at once"
+    ):
+        return self._BatchSize
+
+    BatchSize = property(getBatchSize)
+
+    def getBulkLoad(
+        self, doc="If true, use one transaction per phase and build indexes after"
+    ):
+        return self._BulkLoad
+
+    BulkLoad = property(getBulkLoad)
+
+    def getJournalMode(self, doc="Return the journal mode of the output database"):
+        return self._JournalMode
+
+    JournalMode = property(getJournalMode)
+
+    def getSynchronous(self, doc="Return the synchronous setting of the outfile"):
+        return self._Synchronous
+
+    Synchronous = property(getSynchronous)
+
+    def getBufferSize(self, doc="Return the CSV outfile buffer size in bytes"):
+        return self._BufferSize
+
+    BufferSize = property(getBufferSize)
+
+    def getFlushInterval(
+        self, doc="Return the maximum time in seconds between CSV outfile flushes"
+    ):
+        return self._FlushInterval
+
+    FlushInterval = property(getFlushInterval)
+
+    def getShowProgress(
         self,
-        doc="If true, stdout will display a dot for each matching file (when writing to file)",
+        doc="If true, stdout will display the progress of matching (when writing to file)",
     ):
-        return self._ShowDots
+        return self._ShowProgress
 
-    ShowDots = property(getShowDots)
+    ShowProgress = property(getShowProgress)
 
-    def getFilesPerDot(
+    def getProgressInterval(
         self,
-        doc="Return number of files to scan until a dot is printed",
+        doc="Return the minimum time in seconds between two progress lines",
     ):
-        return self._FilesPerDot
+        return self._ProgressInterval
 
-    FilesPerDot = property(getFilesPerDot)
+    ProgressInterval = property(getProgressInterval)
 
     def IsValid(self):
-        if not self._SourceDB.exists():
+        self.checkDatabaseFile("Source", self._SourceDB)
+        if self._BaseDB is not None:
+            self.checkDatabaseFile("Base", self._BaseDB)
+        for targetDB in [self._TargetDB] + self._ExtraTargets:
+            self.checkDatabaseFile("Target", targetDB)
+
+        self.checkSizes()
+        self.checkSummaryByDir()
+        self.checkIncremental()
+        self.checkExtraTargets()
+        self.checkBaseDB()
+        if self._OutFileType in (3, 4) and self._OutExistsMode == "a":
+            raise ValueError("Arrow or Parquet outfile cannot be updated!")
+
+        self.resolveOutFilePath(self._OutFile)
+
+        return True
+
+    @staticmethod
+    def checkDatabaseFile(role, dbFile):
+        """Raise an error if the database file of the given role is missing."""
+        if not dbFile.exists():
             raise FileNotFoundError(
-                "Source database '{0}' does not exist!".format(self._SourceDB)
+                "{0} database '{1}' does not exist!".format(role, dbFile)
             )
-        if not self._SourceDB.is_file():
-            raise IsADirectoryError("'{0}' is not a file!".format(self._SourceDB))
+        if not dbFile.is_file():
+            raise IsADirectoryError("'{0}' is not a file!".format(dbFile))
 
-        if not self._TargetDB.exists():
-            raise FileNotFoundError(
-                "Target database '{0}' does not exist!".format(self._TargetDB)
+    def checkSizes(self):
+        """Raise an error if a number or size parameter is out of range."""
+        if self._Jobs < 1:
+            raise ValueError("Number of jobs must be at least 1!")
+        if self._QueueSize < 1:
+            raise ValueError("Queue size must be at least 1!")
+        if self._BatchSize < 1:
+            raise ValueError("Batch size must be at least 1!")
+        if self._BufferSize < 1:
+            raise ValueError("Buffer size must be at least 1!")
+        if self._CacheSize < 0:
+            raise ValueError("Cache size must not be negative!")
+        if self._ProgressInterval <= 0:
+            raise ValueError("Progress interval must be greater than 0!")
+
+    def checkSummaryByDir(self):
+        """Raise an error if summary by directory is combined with a mode it
+        does not support.
+        """
+        if self._SummaryByDir and (
+            self._UseDigests
+            or self._MatchDirsFirst
+            or self._Jobs > 1
+            or self._DetectMoves
+        ):
+            raise ValueError(
+                "Summary by directory cannot be combined with digests,"
+                + " dirs first, jobs or moves!"
             )
-        if not self._TargetDB.is_file():
-            raise IsADirectoryError("'{0}' is not a file!".format(self._TargetDB))
 
-        self.resolveOutFilePath(self._OutFile)
+    def checkIncremental(self):
+        """Raise an error if incremental mode lacks a SQLite outfile or is
+        combined with a mode it does not support.
+        """
+        if not self._Incremental:
+            return
+        if self._OutFileType != 1:
+            raise ValueError("Incremental mode requires a SQLite outfile!")
+        if (
+            self._UseDigests
+            or self._MatchDirsFirst
+            or self._SummaryByDir
+            or self._DetectMoves
+        ):
+            raise ValueError(
+                "Incremental mode cannot be combined with digests, dirs first,"
+                + " summary by directory or moves!"
+            )
 
-        return True
+    def checkExtraTargets(self):
+        """Raise an error if several targets lack an outfile or the merge engine,
+        or are combined with a mode they do not support.
+        """
+        if len(self._ExtraTargets) == 0:
+            return
+        if self._UseStdOut:
+            raise ValueError("Several targets require an outfile!")
+        if self._MatchEngine != "merge":
+            raise ValueError("Several targets require the merge engine!")
+        if self.hasPassModes() or self._Incremental:
+            raise ValueError(
+                "Several targets cannot be combined with digests, dirs first,"
+                + " jobs, summary by directory, incremental mode or moves!"
+            )
+
+    def checkBaseDB(self):
+        """Raise an error if a three-way comparison lacks the merge engine or is
+        combined with a mode it does not support.
+        """
+        if self._BaseDB is None:
+            return
+        if self._MatchEngine != "merge":
+            raise ValueError("Three-way comparison requires the merge engine!")
+        if self.hasPassModes() or self._Incremental or len(self._ExtraTargets) > 0:
+            raise ValueError(
+                "Three-way comparison cannot be combined with digests, dirs"
+                + " first, jobs, summary by directory, incremental mode, moves"
+                + " or several targets!"
+            )
+
+    def hasPassModes(self):
+        """Return true if a mode adding passes or processes to the match is set:
+        digests, dirs first, jobs, summary by directory or moves.
+        """
+        return (
+            self._UseDigests
+            or self._MatchDirsFirst
+            or self._Jobs > 1
+            or self._SummaryByDir
+            or self._DetectMoves
+        )
 
     def resolveOutFilePath(self, outfile):
         self._OutFilePath = (
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Class PFSProfile collects timings, row counts, SQLite statement counts and
+peak memory use of the phases of a comparison run.
+"""
+
+# standard imports
+import contextlib
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+def getpeakrss():
+    """Return the peak resident set size of this process and its finished child
+    processes in KiB, or None if unknown.
+    """
+    if resource is None:
+        return None
+
+    peakRSS = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # macOS reports bytes
+    return peakRSS // 1024 if sys.platform == "darwin" else peakRSS
+
+
+class PFSProfile:
+    """Class PFSProfile accumulates per named phase the time taken, the number
+    of rows processed, the number of SQLite statements executed on traced
+    connections, and the peak RSS at the end of the phase. Phases may be
+    entered repeatedly and may be nested (e.g. compare within match).
+    """
+
+    def __init__(self):
+        self._phases = {}
+        self._statementCount = 0
+
+    def getPhases(
+        self,
+        doc="Return a list of tuples (phase, duration, nrows, rowspersec,"
+        + " nstatements, peakrss) in the order the phases were first entered",
+    ):
+        phases = []
+        for name, (duration, rowCount, statementCount, peakRSS) in self._phases.items():
+            rowsPerSecond = None
+            if duration > 0 and rowCount > 0:
+                rowsPerSecond = rowCount / duration
+            phases.append(
+                (name, duration, rowCount, rowsPerSecond, statementCount, peakRSS)
+            )
+        return phases
+
+    Phases = property(getPhases)
+
+    def getStatementCount(self, doc="Return the number of statements traced"):
+        return self._statementCount
+
+    StatementCount = property(getStatementCount)
+
+    def getDuration(self, name):
+        """Return the time taken in a phase in seconds."""
+        return self._phases[name][0] if name in self._phases else 0.0
+
+    def getPhase(self, name):
+        return self._phases.setdefault(name, [0.0, 0, 0, None])
+
+    def tracedb(self, db):
+        """Count the statements executed on the database referenced by the tuple
+        db = (connection, cursor).
+        """
+        db[0].set_trace_callback(self.countStatement)
+
+    def countStatement(self, statement):
+        self._statementCount += 1
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager adding the time taken and statements executed to
+        the phase name.
+        """
+        phase = self.getPhase(name)
+        startTime = time.perf_counter()
+        statementCount = self._statementCount
+        try:
+            yield
+        finally:
+            phase[0] += time.perf_counter() - startTime
+            phase[2] += self._statementCount - statementCount
+            phase[3] = getpeakrss()
+
+    def addRows(self, name, rowCount):
+        """Add to the number of rows processed in phase name."""
+        self.getPhase(name)[1] += rowCount
+
+    def printprofile(self):
+        print("Profile:")
+        print(
+            "\t{0:<10}{1:>10}{2:>12}{3:>12}{4:>12}{5:>12}".format(
+                "phase", "seconds", "rows", "rows/s", "statements", "peak MiB"
+            )
+        )
+        for name, duration, rowCount, rowsPerSecond, statementCount, peakRSS in (
+            self.Phases
+        ):
+            print(
+                "\t{0:<10}{1:>10.3f}{2:>12}{3:>12}{4:>12}{5:>12}".format(
+                    name,
+                    duration,
+                    rowCount,
+                    "-" if rowsPerSecond is None else f"{rowsPerSecond:.0f}",
+                    statementCount,
+                    "-" if peakRSS is None else f"{peakRSS / 1024:.1f}",
+                )
+            )
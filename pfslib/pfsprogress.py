@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/17/2023"
+
+"""Class PFSProgress reports the progress of a comparison phase in intervals
+of time, with percent done, rows per second and estimated time remaining.
+"""
+
+# standard imports
+import datetime
+import sys
+import time
+
+# number of rows processed between two checks of the time
+PROGRESS_CHECK_ROWS = 4096
+
+
+class PFSProgress:
+    """Class PFSProgress prints a progress line at most once per interval while
+    a phase is running, and a final line when the phase ends (only if progress
+    was shown at all). Callers check their row count against a threshold in the
+    loop and call update every PROGRESS_CHECK_ROWS rows only, so the time is
+    not looked up per row.
+    """
+
+    def __init__(self, interval=1.0, stream=None):
+        self._interval = interval
+        self._stream = sys.stdout if stream is None else stream
+        # overwrite the progress line on terminals, otherwise one line each
+        self._isTTY = self._stream.isatty()
+        self._name = None
+        self._total = 0
+        self._startTime = 0.0
+        self._lastTime = 0.0
+        self._shown = False
+
+    def start(self, name, total):
+        """Start reporting the progress of phase name with total rows to
+        process.
+        """
+        self._name = name
+        self._total = total
+        self._startTime = self._lastTime = time.monotonic()
+        self._shown = False
+
+    def update(self, done):
+        """Print the progress with done rows processed if the interval has
+        passed since the last line.
+        """
+        now = time.monotonic()
+        if now - self._lastTime < self._interval:
+            return
+        self._lastTime = now
+        self.printprogress(done, now)
+
+    def finish(self, done):
+        """End the phase with done rows processed."""
+        if self._shown:
+            self.printprogress(done, time.monotonic(), True)
+        self._name = None
+
+    def printprogress(self, done, now, final=False):
+        duration = now - self._startTime
+        rowsPerSecond = done / duration if duration > 0 else 0.0
+
+        line = "{0}: {1:>10} rows".format(self._name, done)
+        if self._total > 0:
+            # totals are counted up front and may be estimates
+            line += " {0:6.1%}".format(min(done / self._total, 1.0))
+        line += ", {0:.0f} rows/s".format(rowsPerSecond)
+        if final:
+            line += ", took {0:.2f} seconds".format(duration)
+        elif self._total > done and rowsPerSecond > 0:
+            eta = (self._total - done) / rowsPerSecond
+            line += ", ETA {0}".format(formatduration(eta))
+
+        if self._isTTY:
+            self._stream.write("\r" + line.ljust(79) + ("\n" if final else ""))
+        else:
+            self._stream.write(line + "\n")
+        self._stream.flush()
+        self._shown = True
+
+
+def formatduration(seconds):
+    """Return a duration in seconds as string 'h:mm:ss'."""
+    return str(datetime.timedelta(seconds=round(seconds)))
@@ -10,22 +10,45 @@ __date__ = "07/16/2023"
 """
 
 # standard imports
+import pathlib
 import sqlite3
 
 
-def opendb(dbFileName):
-    """Open a SQLite database file and return a tuple with connection and cursor object."""
-    connection = sqlite3.connect(dbFileName)
+def opendb(dbFileName, uri=False, checkSameThread=True):
+    """Open a SQLite database file and return a tuple with connection and cursor object.
+    If uri is true, dbFileName is interpreted as a SQLite URI filename.
+    If checkSameThread is false, the connection may be used by other threads
+    than the one opening it.
+    """
+    connection = sqlite3.connect(
+        dbFileName, uri=uri, check_same_thread=checkSameThread
+    )
     cursor = connection.cursor()
     return (connection, cursor)
 
 
+def getfilestate(dbFileName):
+    """Return a string identifying the state of a database file: size and
+    modification time of the file and of its write-ahead log, whose committed
+    transactions leave the main file unchanged until a checkpoint.
+    """
+    dbFileName = pathlib.Path(dbFileName)
+    stat = dbFileName.stat()
+    state = f"{stat.st_size}:{stat.st_mtime_ns}"
+    walPath = dbFileName.with_name(dbFileName.name + "-wal")
+    try:
+        walStat = walPath.stat()
+    except FileNotFoundError:
+        return state
+    return f"{state}:{walStat.st_size}:{walStat.st_mtime_ns}"
+
+
 def tableexists(db, tableName):
     """Return true if tablename exists in the database."""
     selectCmd = (
         f"SELECT name FROM sqlite_master WHERE type='table' AND name='{tableName}'"
     )
-    return db[1].execute(selectCmd) is not None
+    return db[1].execute(selectCmd).fetchone() is not None
 
 
 def createtable(db, newTable, columnNames, ifnotexists=False, constraint=None):
@@ -66,6 +89,38 @@ def gettablecolnames(db, tablename):
     return [colname for colname, in res]
 
 
+def getindexcolnames(db, tablename, schemaName="main"):
+    """Return a list with the column name lists of all indexes of that table."""
+    selectCmd = f"SELECT name FROM pragma_index_list('{tablename}', '{schemaName}')"
+    indexNames = [name for name, in db[1].execute(selectCmd).fetchall()]
+    indexColNames = []
+    for indexName in indexNames:
+        selectCmd = (
+            f"SELECT name FROM pragma_index_info('{indexName}', '{schemaName}')"
+            + " ORDER BY seqno"
+        )
+        res = db[1].execute(selectCmd).fetchall()
+        indexColNames.append([colname for colname, in res])
+    return indexColNames
+
+
+def hasindex(db, tablename, colNames, schemaName="main"):
+    """Return true if an index of that table starts with the given columns."""
+    return any(
+        indexColNames[: len(colNames)] == colNames
+        for indexColNames in getindexcolnames(db, tablename, schemaName)
+    )
+
+
+def createindex(db, indexName, tablename, colNames, ifnotexists=False):
+    """Create an index on the columns of a table."""
+    definition = ", ".join(colNames)
+    ifNotExists = "IF NOT EXISTS " if ifnotexists else ""
+    sqlCmd = f"CREATE INDEX {ifNotExists}{indexName} ON {tablename}({definition})"
+    db[1].execute(sqlCmd)
+    db[0].commit()
+
+
 def getrowid(db, tablename, conditions):
     """Return the ID column value of the row matching the conditions clause or
     return None if no matching row exists.
@@ -107,6 +162,23 @@ def updaterow(db, tablename, columnpattern, condition, params):
     db[0].commit()
 
 
+def setpragma(db, pragmaName, value, schemaName="main"):
+    """Set a pragma value for a (possibly attached) schema of the database."""
+    db[1].execute(f"PRAGMA {schemaName}.{pragmaName} = {value}")
+
+
+def attachdb(db, dbFileName, schemaName):
+    """Attach another database file (or URI) under the given schema name
+    to the database referenced by the tuple db = (connection, cursor).
+    """
+    db[1].execute(f"ATTACH DATABASE ? AS {schemaName}", (str(dbFileName),))
+
+
+def detachdb(db, schemaName):
+    """Detach a database previously attached under the given schema name."""
+    db[1].execute(f"DETACH DATABASE {schemaName}")
+
+
 def closedb(db):
     """Close the database connection."""
     db[0].close()
@@ -11,19 +11,65 @@ It takes a PFSParams object and performs the comparison.
 """
 
 # standard imports
+import multiprocessing
+import os
+import pathlib
+import sqlite3
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # local imports
+import pfslib.pfscompare as pfscompare
+import pfslib.pfsdigest as pfsdigest
+import pfslib.pfskeycache as pfskeycache
+import pfslib.pfsmatchstatus as pfsmatchstatus
+import pfslib.pfsmerge as pfsmerge
+import pfslib.pfsmove as pfsmove
 import pfslib.pfsout as pfsout
+import pfslib.pfsoutarrow as pfsoutarrow
+import pfslib.pfsoutasync as pfsoutasync
+import pfslib.pfsoutjson as pfsoutjson
 import pfslib.pfsoutsqlite as pfsoutsqlite
+import pfslib.pfsprofile as pfsprofile
+import pfslib.pfsprogress as pfsprogress
 import pfslib.pfsql as pfsql
+import pfslib.pfsshard as pfsshard
+import pfslib.pfssync as pfssync
 
 
 class PFSRunException(Exception):
     """Exception class used by PFSRun."""
 
 
+# size of memory-mapped I/O and page cache for databases read in place
+MMAP_SIZE_MAX = 1 << 30
+CACHE_SIZE_KIB = 64 * 1024
+
+# number of shards per worker process for --jobs (with indexed listings)
+SHARDS_PER_JOB = 8
+
+# number of result rows passed to the output object at once
+OUTPUT_BATCH_SIZE = 1000
+
+# run of a worker process with the listings opened, set by initshardworker
+_shardRun = None
+
+
+def initshardworker(params, memcopy, commonColNames, dirTables, dirConditions):
+    """Initialize a worker process: open and prepare the listings once for all
+    shards matched by the process.
+    """
+    global _shardRun
+    _shardRun = PFSRun(params)
+    _shardRun.openShardWorker(memcopy, commonColNames, dirTables, dirConditions)
+
+
+def matchshard(shardCondition):
+    """Match and compare the files of one shard in a worker process."""
+    return _shardRun.matchShard(shardCondition)
+
+
 class PFSRun:
     """Class PFSRun defines the basic file listing comparison behaviour.
     It takes a PFSParams object and performs the comparison.
@@ -34,84 +80,499 @@ class PFSRun:
         self._countFiles = 0
         self._sourceDB = None
         self._targetDB = None
+        self._baseDB = None
+        # database files read: the listings or their prepared copies
+        self._sourceFile = params.SourceDB
+        self._targetFile = params.TargetDB
+        self._baseFile = params.BaseDB
         self._pfsout = None
+        self._memcopy = True
+        self._dirConditions = []
+        self._dirTables = {}
+        # directory states of the previous incremental run
+        self._prevDirStates = None
+        self._dirStates = {}
+        # runs comparing the source with the additional targets
+        self._targetRuns = []
+        self._showTarget = len(params.ExtraTargets) > 0
+        self._progress = None
+        if params.ShowProgress:
+            self._progress = pfsprogress.PFSProgress(params.ProgressInterval)
+        self._onlyChanges = params.OnlyChanges
 
     def getCountFiles(self, doc="Return the number of files found"):
         return self._countFiles
 
     CountFiles = property(getCountFiles)
 
+    def getProfile(self, doc="Return the PFSProfile of the last run"):
+        return self._profile
+
+    Profile = property(getProfile)
+
+    def resetCounts(self):
+        self._countFiles = 0
+        self._differingFileCount = 0
+        self._matchBatch = []
+        self._compareBatch = []
+        # rows of lonely and extra files kept for move detection
+        self._moveCandidates = ([], []) if self._params.DetectMoves else None
+        self._moveCounts = [0, 0]
+        # files per sync status of a three-way comparison
+        self._syncCounts = [0, 0, 0, 0]
+        self._profile = pfsprofile.PFSProfile()
+        # _countFiles at which the progress is checked next
+        self._progressCount = sys.maxsize
+        self._progressBase = (0, 0)
+        # only the row engine needs to look up the status of files seen before,
+        # incremental runs store the file counts per directory
+        self._matchStatus = pfsmatchstatus.PFSMatchStatus(
+            keepKeys=self._params.MatchEngine == "row",
+            countDirs=self._params.Incremental,
+        )
+
     def Run(self):
         """Run the file database comparison."""
         resultStats = None
 
-        self._countFiles = 0
-        self._differingFileCount = 0
+        self.resetCounts()
 
         try:
-            self._sourceDB = self.openFileListDB(self._params.SourceDB)
-            self._targetDB = self.openFileListDB(self._params.TargetDB)
-
-            if self._targetDB is None and self._sourceDB is None:
-                raise PFSRunException("No database opened!?")
+            self._memcopy = self.useMemCopy()
+            self.openFileListDBs()
 
             self._doCompare = self.getCommonColNames()
+            self.openTargetRuns()
 
             # call after source/target database were opened
             # and common column names were set
             self.createpfsout()
+            for run in self._targetRuns:
+                run.createpfsout()
 
             # set start time after possible user interaction in createpflout
             startTime = time.time()
 
             try:
-                # match files source vs. target
-                fileMatchStatus = self.matchFiles()
+                if self._params.SummaryByDir:
+                    # count files per directory in aggregate instead of matching
+                    self.runPhase("summary", self.summarizeDirs)
+                else:
+                    self.matchAll()
 
                 if self._countFiles == 0:
                     print("Databases contain no file data.")
                     return
 
-                # compare properties of files found in both databases
-                if self._doCompare:
-                    self.compareFiles(fileMatchStatus)
-
-                resultStats = self.getResultStats(fileMatchStatus)
+                resultStats = self.getResultStats()
                 self.printResults(resultStats)
+                for run in self._targetRuns:
+                    run.printResults(run.getResultStats())
             finally:
                 duration = time.time() - startTime
 
                 # close outfile
-                if self._params.OutFileType == 1 and resultStats is not None:
+                if resultStats is not None:
                     self._pfsout.updateStats(resultStats, duration)
-                self._pfsout.close()
+                    statsCounts = self.getStatsCounts()
+                    if len(statsCounts) > 0:
+                        self._pfsout.writeStatsCounts(statsCounts)
+                    for run in self._targetRuns:
+                        run._pfsout.updateStats(run.getResultStats(), duration)
+                # finish the outfiles first, so the stored profile includes
+                # their index builds
+                with self._profile.phase("close"):
+                    self._pfsout.finish()
+                    for run in self._targetRuns:
+                        if run._pfsout is not None:
+                            run._pfsout.finish()
+                if self._params.Profile:
+                    self._pfsout.writeProfile(self._profile.Phases)
+                with self._profile.phase("close"):
+                    self._pfsout.close()
+                    for run in self._targetRuns:
+                        if run._pfsout is not None:
+                            run._pfsout.close()
 
                 print("Took {0:.2f} seconds.".format(duration))
+                if self._params.Profile:
+                    self._profile.printprofile()
         finally:
-            # close database connections
-            if self._targetDB is not None:
-                self.closeFileListDB(self._targetDB)
-            if self._sourceDB is not None:
-                self.closeFileListDB(self._sourceDB)
+            self.closeFileListDBs()
 
-    def openFileListDB(self, dbfilename):
-        db = pfsql.opendb(dbfilename)
-        
+    def matchAll(self):
+        """Match and compare all files, with the optional directory passes
+        before.
+        """
+        # keep the results of directories unchanged since the last run
+        if self._params.Incremental:
+            self.runPhase("carryover", self.carryOverDirs)
+
+        # report identical sub-trees in bulk and exclude their files
+        if self._params.UseDigests:
+            self.runPhase("digest", self.matchSameSubtrees)
+
+        # classify files in directories present on one side only
+        if self._params.MatchDirsFirst:
+            self.runPhase("dirs", self.matchDirs)
+
+        # match files source vs. target and compare properties
+        # of files found in both databases
+        if self._params.Jobs > 1:
+            self.runPhase("match", self.matchFilesSharded)
+        else:
+            self.runPhase("match", self.matchFiles)
+
+        # pair lonely and extra files as moved or renamed
+        if self._params.DetectMoves:
+            self.runPhase("moves", self.matchMoves)
+
+        # store the directory states for the next incremental run
+        if self._params.Incremental:
+            self.runPhase("state", self.saveDirStates)
+
+    def runPhase(self, name, method):
+        """Run a comparison phase, profiling its time and number of files."""
+        countFiles = self._countFiles
         try:
-            if not pfsql.tableexists(db, "filelist") or not pfsql.tableexists(
-                db, "dirlist"
-            ):
-                raise PFSRunException(
-                    f"'{dbfilename}' is not a valid file listing database!"
+            with self._profile.phase(name):
+                method()
+        finally:
+            self.finishProgress()
+            self._profile.addRows(name, self._countFiles - countFiles)
+
+    def openFileListDBs(self, verbose=True):
+        """Open source and target database (or their prepared copies if
+        UseKeyCache is set) as selected by _memcopy and prepare indexes.
+        """
+        with self._profile.phase("load"):
+            if self._params.UseKeyCache:
+                self.prepareListings(verbose)
+
+            if self._memcopy:
+                self._sourceURI = self.getMemDBURI("source")
+                self._targetURI = self.getMemDBURI("target")
+            else:
+                self._sourceURI = self.getFileDBURI(self._sourceFile)
+                self._targetURI = self.getFileDBURI(self._targetFile)
+            self.loadFileListDBs(verbose)
+            if self._baseFile is not None:
+                self.loadBaseDB(verbose)
+
+        if self._targetDB is None and self._sourceDB is None:
+            raise PFSRunException("No database opened!?")
+
+        if self._params.Profile:
+            self._profile.tracedb(self._sourceDB)
+            self._profile.tracedb(self._targetDB)
+            if self._baseDB is not None:
+                self._profile.tracedb(self._baseDB)
+
+        with self._profile.phase("index"):
+            self.prepareIndexes(verbose)
+        if verbose and self._memcopy:
+            print(
+                "Indexed databases in {0:.2f} seconds.".format(
+                    self._profile.getDuration("index")
                 )
-            
-            memdb = pfsql.opendb(":memory:")
+            )
+
+    def loadFileListDBs(self, verbose=True):
+        """Open (and copy) source and target database concurrently in two threads,
+        since sqlite3 releases the GIL while copying. Report the time taken for
+        each database if verbose.
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(self.timedOpenFileListDB, dbfilename, dburi)
+                for dbfilename, dburi in (
+                    (self._sourceFile, self._sourceURI),
+                    (self._targetFile, self._targetURI),
+                )
+            ]
+
+        results = []
+        error = None
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append((None, 0.0))
+                error = error or e
+
+        (self._sourceDB, sourceDuration), (self._targetDB, targetDuration) = results
+        if error is not None:
+            raise error
+
+        if verbose:
+            print(
+                "Loaded source in {0:.2f} seconds, target in {1:.2f} seconds.".format(
+                    sourceDuration, targetDuration
+                )
+            )
+
+    def loadBaseDB(self, verbose=True):
+        """Open (and copy) the base database of a three-way comparison."""
+        if self._memcopy:
+            baseURI = self.getMemDBURI("base")
+        else:
+            baseURI = self.getFileDBURI(self._baseFile)
+        self._baseDB, duration = self.timedOpenFileListDB(self._baseFile, baseURI)
+
+        if verbose:
+            print("Loaded base in {0:.2f} seconds.".format(duration))
+
+    def prepareListings(self, verbose=True):
+        """Select the prepared copies of both listings from the key cache to be
+        read instead, and evict the least recently used other cache files.
+        """
+        self._sourceFile = self.getPreparedListing(self._params.SourceDB, verbose)
+        self._targetFile = self.getPreparedListing(self._params.TargetDB, verbose)
+        if self._params.BaseDB is not None:
+            self._baseFile = self.getPreparedListing(self._params.BaseDB, verbose)
+
+        if self._params.CacheDir is not None:
+            # keep the caches of the additional targets prepared afterwards
+            extraFiles = [
+                pfskeycache.getcachepath(targetDB, self._params.CacheDir)
+                for targetDB in self._params.ExtraTargets
+            ]
+            if self._params.BaseDB is not None:
+                extraFiles.append(self._baseFile)
+            pfskeycache.evictcaches(
+                self._params.CacheDir,
+                self._params.CacheSize,
+                [self._sourceFile, self._targetFile] + extraFiles,
+            )
+
+    def getPreparedListing(self, dbfilename, verbose=True):
+        """Return the path of the prepared copy of a listing database from the
+        key cache, building it if missing or outdated.
+        """
+        try:
+            startTime = time.time()
+            cachePath, built = pfskeycache.getpreparedlisting(
+                dbfilename, self._params.CacheDir
+            )
+        except (sqlite3.Error, OSError) as e:
+            raise PFSRunException(f"Could not prepare '{dbfilename}': {e}")
+
+        if verbose and built:
+            print(
+                "Prepared '{0}' in {1:.2f} seconds.".format(
+                    dbfilename, time.time() - startTime
+                )
+            )
+        return cachePath
+
+    def timedOpenFileListDB(self, dbfilename, dburi):
+        """Open a file listing database and return a tuple with the
+        (connection, cursor) tuple and the time taken.
+        """
+        startTime = time.time()
+        db = self.openFileListDB(dbfilename, dburi, self._memcopy)
+        return (db, time.time() - startTime)
+
+    def openTargetRuns(self):
+        """Create a run per additional target, comparing the source database
+        opened by this run with that target, and open the target databases.
+        """
+        for index in range(len(self._params.ExtraTargets)):
+            run = PFSRun(self._params.getTargetParams(index))
+            self._targetRuns.append(run)
+            run.openTargetDB(self._sourceDB, self._memcopy, self._profile)
+
+    def openTargetDB(self, sourceDB, memcopy, profile):
+        """Open the target database of a run comparing it with the source
+        database already opened by another run, whose profile is shared.
+        """
+        self.resetCounts()
+        self._profile = profile
+        self._progress = None
+        self._showTarget = True
+        self._memcopy = memcopy
+        self._sourceDB = sourceDB
+
+        with self._profile.phase("load"):
+            if self._params.UseKeyCache:
+                self._targetFile = self.getPreparedListing(self._params.TargetDB)
+            if memcopy:
+                self._targetURI = self.getMemDBURI("target")
+            else:
+                self._targetURI = self.getFileDBURI(self._targetFile)
+            self._targetDB = self.openFileListDB(
+                self._targetFile, self._targetURI, memcopy
+            )
+
+        if self._params.Profile:
+            self._profile.tracedb(self._targetDB)
+
+        with self._profile.phase("index"):
+            self.prepareIndex(self._targetDB, self._targetFile)
+
+        self._doCompare = self.getCommonColNames()
+
+    def closeTargetDB(self):
+        """Close the target database of a run opened by openTargetDB, leaving
+        the shared source database open.
+        """
+        if self._targetDB is not None:
+            self.closeFileListDB(self._targetDB)
+            self._targetDB = None
+        self._sourceDB = None
+
+    def closeFileListDBs(self):
+        """Close database connections."""
+        for run in self._targetRuns:
+            run.closeTargetDB()
+        if self._baseDB is not None:
+            self.closeFileListDB(self._baseDB)
+            self._baseDB = None
+        if self._targetDB is not None:
+            self.closeFileListDB(self._targetDB)
+            self._targetDB = None
+        if self._sourceDB is not None:
+            self.closeFileListDB(self._sourceDB)
+            self._sourceDB = None
+
+    def useMemCopy(self):
+        """Return true if the databases shall be copied into memory. Unless set
+        by parameter, copy only if the engine benefits from it (the streaming
+        merge engine does not, nor do prepared copies from the key cache, which
+        are indexed, with --jobs) and the files fit well into available memory,
+        once per worker process with --jobs.
+        """
+        if self._params.MemCopy is not None:
+            return self._params.MemCopy
+
+        if self._params.MatchEngine == "merge":
+            return False
+        if self._params.Jobs > 1 and self._params.UseKeyCache:
+            return False
+
+        availableMemory = self.getAvailableMemory()
+        if availableMemory is None:
+            return True
+
+        dbSize = (
+            self._params.SourceDB.stat().st_size + self._params.TargetDB.stat().st_size
+        )
+        if self._params.BaseDB is not None:
+            dbSize += self._params.BaseDB.stat().st_size
+        # copies of the main process and the worker processes
+        if self._params.Jobs > 1:
+            dbSize *= self._params.Jobs + 1
+        # leave room for automatic indexes and the rest of the process
+        memcopy = 2 * dbSize < availableMemory
+        if not memcopy:
+            print("Databases too large for memory, read in place.")
+        return memcopy
+
+    @staticmethod
+    def getAvailableMemory():
+        """Return the available physical memory in bytes or None if unknown."""
+        try:
+            with open("/proc/meminfo") as meminfo:
+                for line in meminfo:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+
+        try:
+            return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (AttributeError, ValueError, OSError):
+            return None
+
+    def getMemDBURI(self, name):
+        """Return a URI for a named in-memory database which can be attached by
+        other connections of this run (shared cache).
+        """
+        return f"file:pfs{id(self)}{name}?mode=memory&cache=shared"
+
+    def getFileDBURI(self, dbfilename):
+        """Return a URI to open a database file read-only. Unless the file has a
+        write-ahead log, whose committed rows SQLite would ignore, it is declared
+        immutable, so SQLite skips locking and change detection while reading.
+        """
+        dbfilename = pathlib.Path(dbfilename)
+        dburi = dbfilename.resolve().as_uri() + "?mode=ro"
+        if not dbfilename.with_name(dbfilename.name + "-wal").exists():
+            dburi += "&immutable=1"
+        return dburi
+
+    def tuneReadOnlyDB(self, db, dbfilename, schemaName="main"):
+        """Set pragmas for reading a database file in place: map the file into
+        memory (up to MMAP_SIZE_MAX) and enlarge the page cache.
+        """
+        mmapSize = min(pathlib.Path(dbfilename).stat().st_size, MMAP_SIZE_MAX)
+        pfsql.setpragma(db, "mmap_size", mmapSize, schemaName)
+        pfsql.setpragma(db, "cache_size", -CACHE_SIZE_KIB, schemaName)
+
+    def openFileListDB(self, dbfilename, dburi, memcopy=True):
+        """Open a file listing database and return its (connection, cursor) tuple.
+        If memcopy is true, the file is copied into the in-memory database given
+        by dburi, otherwise dburi refers to the file itself which is read in place.
+        """
+        if not memcopy:
+            db = pfsql.opendb(dburi, uri=True, checkSameThread=False)
+            try:
+                self.checkFileListDB(db, dbfilename)
+                self.tuneReadOnlyDB(db, dbfilename)
+            except Exception:
+                pfsql.closedb(db)
+                raise
+            return db
+
+        db = pfsql.opendb(dbfilename)
+
+        try:
+            self.checkFileListDB(db, dbfilename)
+
+            memdb = pfsql.opendb(dburi, uri=True, checkSameThread=False)
             db[0].backup(memdb[0])
         finally:
             pfsql.closedb(db)
-            
+
         return memdb
 
+    def checkFileListDB(self, db, dbfilename):
+        if not pfsql.tableexists(db, "filelist") or not pfsql.tableexists(
+            db, "dirlist"
+        ):
+            raise PFSRunException(
+                f"'{dbfilename}' is not a valid file listing database!"
+            )
+
+    def prepareIndexes(self, verbose=True):
+        """Create the indexes used for file lookups by directory path and filename
+        on in-memory database copies (never on the database files), or check
+        whether suitable indexes exist in databases read in place (only relevant
+        for the row engine, SQLite creates automatic indexes for the set engine).
+        """
+        self.prepareIndex(self._sourceDB, self._sourceFile, verbose)
+        self.prepareIndex(self._targetDB, self._targetFile, verbose)
+        if self._baseDB is not None:
+            self.prepareIndex(self._baseDB, self._baseFile, verbose)
+
+    def prepareIndex(self, db, dbfilename, verbose=True):
+        """Create or check the lookup indexes of one database, see
+        prepareIndexes.
+        """
+        if self._memcopy:
+            pfsql.createindex(db, "pfs_dirlist_path", "dirlist", ["path", "id"], True)
+            pfsql.createindex(
+                db, "pfs_filelist_path", "filelist", ["path", "filename"], True
+            )
+        elif verbose and self._params.MatchEngine == "row" and (
+            not pfsql.hasindex(db, "dirlist", ["path"])
+            or not pfsql.hasindex(db, "filelist", ["path", "filename"])
+        ):
+            print(
+                f"'{dbfilename}' has no index on dirlist(path)"
+                + " and filelist(path, filename), lookups may be slow."
+            )
+
     def getCommonColNames(self):
         """Get a list of column names present in both 'filelist' tables
         in the two databases compared. Return true if this list is not empty.
@@ -136,9 +597,15 @@ class PFSRun:
             return False
 
     def createpfsout(self):
-        """Create the output object for data display or storage."""
+        """Create the output object for data display or storage, running on
+        a writer thread if AsyncOutput is set.
+        """
         if self._params.UseStdOut:
             self._pfsout = pfsout.PFSOutStd(self._commonColNames)
+            if self._params.AsyncOutput:
+                self._pfsout = pfsoutasync.PFSOutAsync(
+                    self._pfsout, self._params.QueueSize
+                )
             return
 
         print("Write results to {}".format(self._params.OutFilePath))
@@ -152,36 +619,778 @@ class PFSRun:
         else:
             overwrite = self._params.OutExistsMode
 
-        if self._params.OutFileType == 1:
-            self._pfsout = pfsoutsqlite.PFSOutSqlite(
+        if self._params.Incremental and overwrite == "a":
+            self._prevDirStates = pfsoutsqlite.readdirstates(
+                self._params.OutFilePath, self._params.SourceDB, self._params.TargetDB
+            )
+
+        self._pfsout = self.createFileOut()
+        if self._params.AsyncOutput:
+            self._pfsout = pfsoutasync.PFSOutAsync(self._pfsout, self._params.QueueSize)
+
+        self._pfsout.openout(overwrite)
+        self._pfsout.writeStats(self._params)
+
+    def createFileOut(self):
+        """Return the output object writing to the outfile in the format
+        selected by OutFileType.
+        """
+        outFileType = self._params.OutFileType
+        if outFileType == 1:
+            return pfsoutsqlite.PFSOutSqlite(
                 self._params.OutFilePath,
                 self._commonColNames,
+                self._params.BatchSize,
+                self._params.BulkLoad,
+                self._params.JournalMode,
+                self._params.Synchronous,
+                self._params.Incremental,
             )
-        else:
-            self._pfsout = pfsout.PFSOutCSV(
+        if outFileType == 2:
+            return pfsoutjson.PFSOutJSONL(
                 self._params.OutFilePath,
                 self._commonColNames,
+                self._params.BufferSize,
+                self._params.FlushInterval,
             )
+        if outFileType in (3, 4):
+            return pfsoutarrow.PFSOutArrow(
+                self._params.OutFilePath,
+                self._commonColNames,
+                outFileType == 4,
+                self._params.SummaryByDir,
+            )
+        return pfsout.PFSOutCSV(
+            self._params.OutFilePath,
+            self._commonColNames,
+            self._params.BufferSize,
+            self._params.FlushInterval,
+            self._params.SummaryByDir,
+        )
 
-        self._pfsout.openout(overwrite)
+    def getDirCondition(self, dirAlias):
+        """Return the SQL condition restricting the directories (in the dirlist
+        table referenced by dirAlias) whose files are matched.
+        """
+        if len(self._dirConditions) == 0:
+            return "1"
+        return " AND ".join(c.format(d=dirAlias) for c in self._dirConditions)
 
-        if self._params.OutFileType == 1:
-            self._pfsout.writeStats(self._params)
+    def createDirTable(self, tableName, paths):
+        """Create a temporary table with directory paths in both database
+        connections, to be used in directory conditions.
+        """
+        self._dirTables[tableName] = paths
+        for db in (self._sourceDB, self._targetDB):
+            pfsql.createtable(db, f"temp.{tableName}", ["path PRIMARY KEY"])
+            db[1].executemany(
+                f"INSERT OR IGNORE INTO temp.{tableName} VALUES (?)",
+                ((path,) for path in paths),
+            )
+            db[0].commit()
+
+    def getDirDigests(self, db, dbfilename):
+        """Return the subtree digests of all directories in a database."""
+        return pfsdigest.rollupdigests(self.getOwnDirDigests(db, dbfilename))
+
+    def getOwnDirDigests(self, db, dbfilename):
+        """Return the digests of the files directly in each directory of a
+        database, computing them or reading them from the cache file.
+        """
+        fileColumns = self.getFileColumns()
+        dirDigests = None
+        if self._params.CacheDigests:
+            dirDigests = pfsdigest.loaddigestcache(dbfilename, fileColumns)
+
+        if dirDigests is None:
+            dirDigests = pfsdigest.getdirdigests(db, fileColumns)
+            if self._params.CacheDigests and not pfsdigest.savedigestcache(
+                dbfilename, fileColumns, dirDigests
+            ):
+                print(f"Could not write digest cache for '{dbfilename}'.")
+
+        return dirDigests
+
+    def matchSameSubtrees(self):
+        """Compare subtree digests of both databases, report each largest
+        identical sub-tree as same and exclude all its directories from file
+        matching.
+        """
+        sourceDigests = self.getDirDigests(self._sourceDB, self._params.SourceDB)
+        targetDigests = self.getDirDigests(self._targetDB, self._params.TargetDB)
+
+        samePaths = [
+            path
+            for path, digest in sourceDigests.items()
+            if targetDigests.get(path) == digest
+        ]
+        if len(samePaths) == 0:
+            return
+
+        samePathSet = set(samePaths)
+        for path in sorted(samePaths):
+            # sub-directories of identical directories are identical, too
+            if pfsdigest.getparentpath(path) in samePathSet:
+                continue
+            fileCount = sourceDigests[path][1]
+            if fileCount == 0:
+                continue
+            self._countFiles += fileCount
+            self._matchStatus.addCount(0, fileCount)
+            self.writeDirMatch(path, 0, fileCount)
+
+        self.createDirTable("pfs_samedirs", samePaths)
+        self._dirConditions.append(
+            "{d}.path NOT IN (SELECT path FROM temp.pfs_samedirs)"
+        )
+
+    def getDirFileCounts(self, db):
+        """Return a dictionary mapping the path of each directory (matching the
+        directory condition) to the number of files in it.
+        """
+        selectCmd = (
+            "SELECT dirlist.path, COUNT(filelist.filename) FROM dirlist"
+            + " LEFT JOIN filelist ON dirlist.id = filelist.path"
+            + " WHERE "
+            + self.getDirCondition("dirlist")
+            + " GROUP BY dirlist.path"
+        )
+        return dict(db[1].execute(selectCmd).fetchall())
+
+    def matchDirs(self):
+        """Match directory paths of both databases. Classify all files in
+        directories found in the source only as lonely and in the target only as
+        extra, and exclude these directories from file matching. Write one
+        result per largest one-sided sub-tree if WriteDirRecords is set,
+        otherwise one result per file.
+        """
+        sourceDirs = self.getDirFileCounts(self._sourceDB)
+        targetDirs = self.getDirFileCounts(self._targetDB)
+
+        lonelyDirs = [path for path in sourceDirs if path not in targetDirs]
+        extraDirs = [path for path in targetDirs if path not in sourceDirs]
+        if not self._params.WriteDirRecords:
+            self.startProgress(
+                "dirs",
+                lambda: sum(sourceDirs[path] for path in lonelyDirs)
+                + sum(targetDirs[path] for path in extraDirs),
+            )
+
+        try:
+            for db, dirFileCounts, dirs, matchStatus, tableName in (
+                (self._sourceDB, sourceDirs, lonelyDirs, 1, "pfs_lonelydirs"),
+                (self._targetDB, targetDirs, extraDirs, 2, "pfs_extradirs"),
+            ):
+                self.createDirTable(tableName, dirs)
+
+                for path in dirs:
+                    self._matchStatus.addCount(matchStatus, dirFileCounts[path])
+
+                if self._params.WriteDirRecords:
+                    self._countFiles += sum(dirFileCounts[path] for path in dirs)
+                    self.writeSubtreeRecords(dirFileCounts, dirs, matchStatus)
+                    continue
+
+                filelistCols = ", ".join(
+                    ("filelist." + c) for c in self.getFileColumns()
+                )
+                selectCmd = (
+                    f"SELECT dirlist.path, {filelistCols} FROM dirlist"
+                    + " INNER JOIN filelist ON dirlist.id = filelist.path"
+                    + f" WHERE dirlist.path IN (SELECT path FROM temp.{tableName})"
+                )
+                for row in db[0].execute(selectCmd):
+                    self._countFiles += 1
+                    if self._countFiles >= self._progressCount:
+                        self.printProgress()
+                    self.writeUnmatched(row, matchStatus)
+        finally:
+            self.flushOutput()
+
+        self._dirConditions.append(
+            "{d}.path NOT IN (SELECT path FROM temp.pfs_lonelydirs)"
+            + " AND {d}.path NOT IN (SELECT path FROM temp.pfs_extradirs)"
+        )
+
+    def writeSubtreeRecords(self, dirFileCounts, dirs, matchStatus):
+        """Write one result per largest sub-tree formed by the directories given,
+        with the number of files in all its directories.
+        """
+        dirSet = set(dirs)
+        subtreeFileCounts = {}
+        for path in dirs:
+            root = path
+            parent = pfsdigest.getparentpath(root)
+            while parent in dirSet:
+                root = parent
+                parent = pfsdigest.getparentpath(root)
+            subtreeFileCounts[root] = subtreeFileCounts.get(root, 0) + dirFileCounts[
+                path
+            ]
+
+        for root in sorted(subtreeFileCounts):
+            self.writeDirMatch(root, matchStatus, subtreeFileCounts[root])
+
+    def matchFilesSharded(self):
+        """Partition the directories by path into shards, match and compare the
+        files of each shard in a pool of worker processes, and write the results
+        in shard order.
+        """
+        # without lookup indexes each shard query builds automatic indexes
+        # over a whole listing, so use one shard per worker process then
+        shardCount = self._params.Jobs
+        if self.hasLookupIndexes():
+            shardCount *= SHARDS_PER_JOB
+        dirFileCounts = self.getDirFileCounts(self._sourceDB)
+        for path, fileCount in self.getDirFileCounts(self._targetDB).items():
+            dirFileCounts[path] = dirFileCounts.get(path, 0) + fileCount
+        shardConditions = pfsshard.getshardconditions(
+            pfsshard.getshardbounds(dirFileCounts, shardCount)
+        )
+
+        self.startProgress("match", self.getMatchRowCount)
+        try:
+            with multiprocessing.Pool(
+                self._params.Jobs,
+                initializer=initshardworker,
+                initargs=(
+                    self._params,
+                    self._memcopy,
+                    self._commonColNames,
+                    self._dirTables,
+                    self._dirConditions,
+                ),
+            ) as pool:
+                for (
+                    calls,
+                    counts,
+                    differingFileCount,
+                    moveCandidates,
+                    dirCounts,
+                ) in pool.imap(matchshard, shardConditions):
+                    for method, args in calls:
+                        with self._profile.phase("output"):
+                            getattr(self._pfsout, method)(*args)
+                        # args is a batch of rows
+                        self._profile.addRows("output", len(args[0]))
+                    # count files matched, not results written (see --only-changes
+                    # and --moves)
+                    self._countFiles += sum(counts)
+                    for matchStatus, fileCount in enumerate(counts):
+                        self._matchStatus.addCount(matchStatus, fileCount)
+                    self._differingFileCount += differingFileCount
+                    self._matchStatus.addDirCounts(dirCounts)
+                    if moveCandidates is not None:
+                        self._moveCandidates[0].extend(moveCandidates[0])
+                        self._moveCandidates[1].extend(moveCandidates[1])
+                    if self._countFiles >= self._progressCount:
+                        self.printProgress()
+        finally:
+            self.flushOutput()
+
+    def hasLookupIndexes(self):
+        """Return true if both databases have indexes on dirlist(path) and
+        filelist(path, filename), i.e. are copies in memory or prepared copies.
+        """
+        return self._memcopy or all(
+            pfsql.hasindex(db, "dirlist", ["path"])
+            and pfsql.hasindex(db, "filelist", ["path", "filename"])
+            for db in (self._sourceDB, self._targetDB)
+        )
+
+    def openShardWorker(self, memcopy, commonColNames, dirTables, dirConditions):
+        """Open and prepare the databases in a worker process, with the column
+        names and directory conditions of the main process. The databases stay
+        open for all shards until the process ends.
+        """
+        self.resetCounts()
+        self._memcopy = memcopy
+        self._progress = None
+        self.openFileListDBs(verbose=False)
+
+        self._commonColNames = commonColNames
+        self._doCompare = len(commonColNames) > 0
+        for tableName, paths in dirTables.items():
+            self.createDirTable(tableName, paths)
+        self._workerDirConditions = list(dirConditions)
+
+    def matchShard(self, shardCondition):
+        """Match and compare the files in the directories of one shard, given
+        by its directory condition (in a worker process), and return a tuple
+        with the collected output calls, the match status counts, the number of
+        differing files, the rows of lonely and extra files kept for move
+        detection and the counts per directory (incremental runs only).
+        """
+        self.resetCounts()
+        self._pfsout = pfsshard.PFSOutCollect(self._commonColNames)
+        self._dirConditions = self._workerDirConditions + [shardCondition]
+
+        self.matchFiles()
+
+        return (
+            self._pfsout.Calls,
+            self._matchStatus.Counts,
+            self._differingFileCount,
+            self._moveCandidates,
+            self._matchStatus.DirCounts,
+        )
 
     def matchFiles(self):
-        """Return a dictionary with filenames found in one or both databases,
-        and assigned match status indicating file presence.
+        """Match files and compare files found in both databases in a single pass
+        with the selected engine.
+        """
+        self.startProgress("match", self.getMatchRowCount)
+        if self._params.MatchEngine == "row":
+            return self.matchFilesByRow()
+        if self._params.MatchEngine == "merge":
+            return self.matchFilesByMerge()
+        return self.matchFilesBySet()
+
+    def getFileColumns(self):
+        """Return the filelist columns selected for each file: path and filename
+        followed by the common attribute columns to compare.
+        """
+        return ["path", "filename"] + self._commonColNames[2:]
+
+    def getSideMatchQuery(self, thisSchema, otherSchema):
+        """Return a query listing all files in the database attached as
+        thisSchema joined with the same file in otherSchema. Each row contains
+        dirlist.path and the file columns for both sides, with NULL values for
+        otherSchema if the file does not exist there.
         """
+        thisCols = ", ".join(("this_f." + c) for c in self.getFileColumns())
+        otherCols = ", ".join(("other_f." + c) for c in self.getFileColumns())
+        return f"SELECT this_d.path, {thisCols}, this_d.path, {otherCols}" + (
+            self.getSideMatchSource(thisSchema, otherSchema)
+        )
+
+    def getSideMatchSource(self, thisSchema, otherSchema):
+        """Return the FROM clause of side match queries: all files in thisSchema
+        (this_d, this_f) left joined with the same file in otherSchema
+        (other_d, other_f).
+        """
+        return (
+            f" FROM {thisSchema}.dirlist AS this_d"
+            + f" INNER JOIN {thisSchema}.filelist AS this_f"
+            + " ON this_d.id = this_f.path"
+            + f" LEFT JOIN {otherSchema}.dirlist AS other_d"
+            + " ON other_d.path = this_d.path"
+            + f" LEFT JOIN {otherSchema}.filelist AS other_f"
+            + " ON other_f.path = other_d.id AND other_f.filename = this_f.filename"
+        )
+
+    def matchFilesBySet(self):
+        """Match and compare files with one set-based query per database side.
+        The target database is attached to the source connection, so SQLite can
+        join both file lists (building automatic indexes where needed) instead of
+        running one lookup query per source file. The query returns the columns
+        to compare of both sides, so common files are compared in the same pass.
+        The results are counted in _matchStatus.
+        """
+        pfsql.attachdb(self._sourceDB, self._targetURI, "target")
+        try:
+            if not self._memcopy:
+                self.tuneReadOnlyDB(self._sourceDB, self._targetFile, "target")
+
+            rowLen = len(self.getFileColumns()) + 1
+
+            # source files: common or lonely
+            sourceQuery = (
+                self.getSideMatchQuery("main", "target")
+                + " WHERE "
+                + self.getDirCondition("this_d")
+            )
+            for row in self._sourceDB[0].execute(sourceQuery):
+                self._countFiles += 1
+                if self._countFiles >= self._progressCount:
+                    self.printProgress()
+                if row[rowLen + 2] is None:
+                    self._matchStatus.setStatus(row[0], row[2], 1)
+                    self.writeUnmatched(row, 1)
+                else:
+                    self._matchStatus.setStatus(row[0], row[2], 0)
+                    if self._doCompare:
+                        self.writeCompareRows(row[:rowLen], row[rowLen:])
+                    else:
+                        self.writeMatch(row[0], row[2], 0)
+
+            # target files missing in source: extra
+            extraQuery = (
+                self.getSideMatchQuery("target", "main")
+                + " WHERE other_f.filename IS NULL AND "
+                + self.getDirCondition("this_d")
+            )
+            for row in self._sourceDB[0].execute(extraQuery):
+                self._countFiles += 1
+                if self._countFiles >= self._progressCount:
+                    self.printProgress()
+                self._matchStatus.setStatus(row[0], row[2], 2)
+                self.writeUnmatched(row, 2)
+        finally:
+            self.flushOutput()
+            pfsql.detachdb(self._sourceDB, "target")
+
+    def summarizeDirs(self):
+        """Count files per directory in aggregate and write one summary per
+        directory (only those with changes if OnlyChanges is set).
+        """
+        summaries = self.getDirSummaries()
+
+        rows = []
+        for path in sorted(summaries):
+            commonCount, lonelyCount, extraCount, sameCount, differentCount = (
+                summaries[path]
+            )
+
+            self._countFiles += commonCount + lonelyCount + extraCount
+            for matchStatus, fileCount in enumerate(
+                (commonCount, lonelyCount, extraCount)
+            ):
+                self._matchStatus.addCount(matchStatus, fileCount)
+            self._differingFileCount += differentCount or 0
+
+            changedCount = lonelyCount + extraCount + (differentCount or 0)
+            if self._onlyChanges and changedCount == 0:
+                continue
+            rows.append((path,) + summaries[path])
+
+        with self._profile.phase("output"):
+            self._pfsout.writeDirSummaries(rows)
+        self._profile.addRows("output", len(rows))
+        self.flushOutput()
+
+    def getDirSummaries(self):
+        """Count common, lonely, extra, same and different files per directory
+        (matching the directory condition) with aggregate queries on the attached
+        databases. Return a dictionary mapping directory paths to tuples
+        (ncommon, nlonely, nextra, nsame, ndifferent), nsame and ndifferent
+        being None if no columns are compared.
+        """
+        pfsql.attachdb(self._sourceDB, self._targetURI, "target")
         try:
-            fileMatchStatus = {}
+            if not self._memcopy:
+                self.tuneReadOnlyDB(self._sourceDB, self._targetFile, "target")
+
+            if self._doCompare:
+                sameCondition = " AND ".join(
+                    ["other_f.filename IS NOT NULL"]
+                    + [f"this_f.{c} IS other_f.{c}" for c in self._commonColNames[2:]]
+                )
+                sameCount = f"SUM({sameCondition})"
+            else:
+                sameCount = "NULL"
+
+            # source files: common, lonely and same
+            sourceQuery = (
+                "SELECT this_d.path, SUM(other_f.filename IS NOT NULL),"
+                + f" SUM(other_f.filename IS NULL), {sameCount}"
+                + self.getSideMatchSource("main", "target")
+                + " WHERE "
+                + self.getDirCondition("this_d")
+                + " GROUP BY this_d.path"
+            )
+            summaries = {}
+            for path, commonCount, lonelyCount, sameCount in self._sourceDB[0].execute(
+                sourceQuery
+            ):
+                summaries[path] = [commonCount, lonelyCount, 0, sameCount]
+
+            # target files missing in source: extra
+            extraQuery = (
+                "SELECT this_d.path, COUNT(*)"
+                + self.getSideMatchSource("target", "main")
+                + " WHERE other_f.filename IS NULL AND "
+                + self.getDirCondition("this_d")
+                + " GROUP BY this_d.path"
+            )
+            for path, extraCount in self._sourceDB[0].execute(extraQuery):
+                summaries.setdefault(
+                    path, [0, 0, 0, 0 if self._doCompare else None]
+                )[2] = extraCount
+        finally:
+            pfsql.detachdb(self._sourceDB, "target")
+
+        return {
+            path: (
+                commonCount,
+                lonelyCount,
+                extraCount,
+                sameCount,
+                None if sameCount is None else commonCount - sameCount,
+            )
+            for path, (commonCount, lonelyCount, extraCount, sameCount) in (
+                summaries.items()
+            )
+        }
+
+    def carryOverDirs(self):
+        """Compare the directory digests of both databases with the states
+        stored by the previous incremental run. Count the stored results of
+        directories unchanged on both sides, exclude them from matching and
+        remove the stored results of all other directories.
+        """
+        sourceDigests = self.getOwnDirDigests(self._sourceDB, self._params.SourceDB)
+        targetDigests = self.getOwnDirDigests(self._targetDB, self._params.TargetDB)
+        prevDirStates = self._prevDirStates or {}
+
+        self._dirStates = {}
+        unchangedPaths = []
+        for path in set(sourceDigests) | set(targetDigests):
+            sourceDigest = sourceDigests.get(path, (None, 0))[0]
+            targetDigest = targetDigests.get(path, (None, 0))[0]
+            prevState = prevDirStates.get(path)
+            if prevState is not None and prevState[:2] == (sourceDigest, targetDigest):
+                # counts as (ncommon, nlonely, nextra, nsame, ndifferent)
+                counts = tuple(prevState[2:])
+                unchangedPaths.append(path)
+            else:
+                counts = None
+            self._dirStates[path] = (sourceDigest, targetDigest, counts)
+        removedPaths = [
+            path
+            for path, (_, _, counts) in self._dirStates.items()
+            if counts is None and path in prevDirStates
+        ] + [path for path in prevDirStates if path not in self._dirStates]
+
+        if self._prevDirStates is None:
+            # results of earlier runs are replaced
+            self._pfsout.removeResults(None)
+        else:
+            self._pfsout.removeResults(sorted(removedPaths))
+
+        fileCount = 0
+        for path in unchangedPaths:
+            commonCount, lonelyCount, extraCount, _, differentCount = self._dirStates[
+                path
+            ][2]
+            for matchStatus, count in enumerate((commonCount, lonelyCount, extraCount)):
+                self._matchStatus.addCount(matchStatus, count)
+            self._differingFileCount += differentCount or 0
+            fileCount += commonCount + lonelyCount + extraCount
+        self._countFiles += fileCount
+
+        if len(unchangedPaths) > 0:
+            print(
+                "Kept results of {0} unchanged directories ({1} files).".format(
+                    len(unchangedPaths), fileCount
+                )
+            )
+            self.createDirTable("pfs_unchangeddirs", unchangedPaths)
+            self._dirConditions.append(
+                "{d}.path NOT IN (SELECT path FROM temp.pfs_unchangeddirs)"
+            )
+
+    def saveDirStates(self):
+        """Store the digests and result counts of all directories for the next
+        incremental run, with the counts of the directories matched in this run
+        collected while matching.
+        """
+        dirCounts = self._matchStatus.DirCounts
+
+        rows = []
+        for path in sorted(self._dirStates):
+            sourceDigest, targetDigest, counts = self._dirStates[path]
+            if counts is None:
+                commonCount, lonelyCount, extraCount, differentCount = dirCounts.get(
+                    path, (0, 0, 0, 0)
+                )
+                counts = (commonCount, lonelyCount, extraCount) + (
+                    (commonCount - differentCount, differentCount)
+                    if self._doCompare
+                    else (None, None)
+                )
+            rows.append((path, sourceDigest, targetDigest) + tuple(counts))
+
+        with self._profile.phase("output"):
+            self._pfsout.writeDirStates(rows)
+        self._profile.addRows("output", len(rows))
+
+    def getSortedFilesQuery(self, attrColNames=None):
+        """Return a query listing all files with dirlist.path followed by the
+        filelist columns path, filename and attrColNames (default the common
+        attribute columns), ordered by directory path and filename.
+        """
+        if attrColNames is None:
+            attrColNames = self._commonColNames[2:]
+        filelistCols = ", ".join(
+            ("filelist." + c) for c in ["path", "filename"] + attrColNames
+        )
+        return (
+            f"SELECT dirlist.path, {filelistCols} FROM dirlist"
+            + " INNER JOIN filelist ON dirlist.id = filelist.path"
+            + " WHERE " + self.getDirCondition("dirlist")
+            + " ORDER BY dirlist.path, filelist.filename"
+        )
+
+    def matchFilesByMerge(self):
+        """Match and compare files by merge-walking both databases sorted by
+        directory path and filename. Neither database is copied into memory and
+        no per-file match status is kept, so memory use does not depend on the
+        size of the listings. Return None since match and comparison are
+        completed in one pass, the results are counted in _matchStatus.
+        With additional targets, the source is read once and walked together
+        with all targets, passing the rows of each file to the run of each
+        target.
+        """
+        if len(self._targetRuns) > 0:
+            return self.matchTargetsByMerge()
+        if self._baseDB is not None:
+            return self.matchFilesByBase()
+
+        try:
+            sortedQuery = self.getSortedFilesQuery()
+            sourceRows = self._sourceDB[1].execute(sortedQuery)
+            targetRows = self._targetDB[1].execute(sortedQuery)
+
+            for _, (sourceRow, targetRow) in pfsmerge.mergewalk(
+                (sourceRows, targetRows), lambda row: (row[0], row[2])
+            ):
+                self.matchMergedRow(sourceRow, targetRow)
+        finally:
+            self.flushOutput()
+
+    def matchTargetsByMerge(self):
+        """Match and compare files of the source with this run's target and the
+        additional targets in a single merge walk over all databases.
+        """
+        runs = [self] + self._targetRuns
+        try:
+            # read the attribute columns common with any target from the source
+            attrColNames = [
+                c
+                for c in pfsql.gettablecolnames(self._sourceDB, "filelist")
+                if any(c in run._commonColNames[2:] for run in runs)
+            ]
+            allRows = [
+                self._sourceDB[1].execute(self.getSortedFilesQuery(attrColNames))
+            ]
+            allRows += [
+                run._targetDB[1].execute(run.getSortedFilesQuery()) for run in runs
+            ]
+            projections = [run.getSourceProjection(attrColNames) for run in runs]
+
+            for _, rows in pfsmerge.mergewalk(allRows, lambda row: (row[0], row[2])):
+                sourceRow = rows[0]
+                for run, targetRow, projection in zip(runs, rows[1:], projections):
+                    if sourceRow is None:
+                        if targetRow is not None:
+                            run.matchMergedRow(None, targetRow)
+                    elif projection is None:
+                        run.matchMergedRow(sourceRow, targetRow)
+                    else:
+                        run.matchMergedRow(
+                            tuple(sourceRow[i] for i in projection), targetRow
+                        )
+        finally:
+            for run in runs:
+                run.flushOutput()
+
+    def matchFilesByBase(self):
+        """Classify files in a three-way comparison by merge-walking the base,
+        source and target database together in a single pass. Source and target
+        are matched as in the two-way comparison for the result statistics, each
+        file is written with its sync status (see pfssync), comparing the
+        attribute columns present in all three databases. Files deleted on both
+        sides are skipped.
+        """
+        try:
+            baseColNames = pfsql.gettablecolnames(self._baseDB, "filelist")
+            baseColNames = [c for c in self._commonColNames[2:] if c in baseColNames]
+            # indices of the base columns in source and target rows
+            versionIndices = [self._commonColNames.index(c) + 1 for c in baseColNames]
+
+            sortedQuery = self.getSortedFilesQuery()
+            allRows = (
+                self._baseDB[1].execute(self.getSortedFilesQuery(baseColNames)),
+                self._sourceDB[1].execute(sortedQuery),
+                self._targetDB[1].execute(sortedQuery),
+            )
+
+            for _, (baseRow, sourceRow, targetRow) in pfsmerge.mergewalk(
+                allRows, lambda row: (row[0], row[2])
+            ):
+                if sourceRow is None and targetRow is None:
+                    continue
+                self._countFiles += 1
+                if self._countFiles >= self._progressCount:
+                    self.printProgress()
+                self.matchBaseRows(baseRow, sourceRow, targetRow, versionIndices)
+        finally:
+            self.flushOutput()
+
+    def matchBaseRows(self, baseRow, sourceRow, targetRow, versionIndices):
+        """Classify a file of the three-way merge walk given by its base, source
+        and target row (None where the file is missing), count it and write its
+        sync status.
+        """
+        if targetRow is None:
+            row, matchStatus = sourceRow, 1
+        elif sourceRow is None:
+            row, matchStatus = targetRow, 2
+        else:
+            row, matchStatus = sourceRow, 0
+            if sourceRow[3:] != targetRow[3:]:
+                self._differingFileCount += 1
+                self._matchStatus.addDiffering(row[0])
+        self._matchStatus.setStatus(row[0], row[2], matchStatus)
+
+        syncStatus = pfssync.classifysync(
+            None if baseRow is None else baseRow[3:],
+            pfssync.getversion(sourceRow, versionIndices),
+            pfssync.getversion(targetRow, versionIndices),
+        )
+        self._syncCounts[syncStatus - pfssync.UNCHANGED] += 1
+        if syncStatus != pfssync.UNCHANGED or not self._onlyChanges:
+            self.writeMatch(row[0], row[2], syncStatus)
+
+    def getSourceProjection(self, attrColNames):
+        """Return the indices selecting the columns of this run's rows from
+        source rows read with attribute columns attrColNames, or None if they
+        are the same.
+        """
+        if self._commonColNames[2:] == attrColNames:
+            return None
+        return [0, 1, 2] + [attrColNames.index(c) + 3 for c in self._commonColNames[2:]]
+
+    def matchMergedRow(self, sourceRow, targetRow):
+        """Classify a file of the merge walk given by its source and target
+        row, None where the file is missing, and write the result.
+        """
+        self._countFiles += 1
+        if self._countFiles >= self._progressCount:
+            self.printProgress()
+        if targetRow is None:
+            self._matchStatus.setStatus(sourceRow[0], sourceRow[2], 1)
+            self.writeUnmatched(sourceRow, 1)
+        elif sourceRow is None:
+            self._matchStatus.setStatus(targetRow[0], targetRow[2], 2)
+            self.writeUnmatched(targetRow, 2)
+        else:
+            self._matchStatus.setStatus(sourceRow[0], sourceRow[2], 0)
+            if self._doCompare:
+                self.writeCompareRows(sourceRow, targetRow)
+            else:
+                self.writeMatch(sourceRow[0], sourceRow[2], 0)
+
+    def matchFilesByRow(self):
+        """Match and compare files by querying the target database once per source
+        file (reference implementation for the set-based engine). The match
+        status of source files is stored to find the extra files in the target.
+        """
+        try:
+            # resulting row pattern:
+            # dirlist.path, dirlist.id = filelist.path, filelist.filename...
+            filelistCols = ", ".join(("filelist." + c) for c in self.getFileColumns())
             joinQuery = (
-                "SELECT dirlist.path, filelist.path, filelist.filename FROM dirlist"
+                f"SELECT dirlist.path, {filelistCols} FROM dirlist"
                 + " INNER JOIN filelist ON dirlist.id = filelist.path"
             )
             matchQuery = joinQuery + " WHERE dirlist.path = ? AND filelist.filename = ?"
-            for sourcerow in self._sourceDB[1].execute(joinQuery):
+            scanQuery = joinQuery + " WHERE " + self.getDirCondition("dirlist")
+            for sourcerow in self._sourceDB[1].execute(scanQuery):
                 self._countFiles += 1
-                filePath = "\\".join((sourcerow[0], sourcerow[2]))
+                if self._countFiles >= self._progressCount:
+                    self.printProgress()
 
                 res = self._targetDB[1].execute(
                     matchQuery,
@@ -192,76 +1401,162 @@ class PFSRun:
                 )
                 matchRow = res.fetchone()
                 if matchRow is None:
-                    fileMatchStatus[filePath] = 1
-                    self._pfsout.writeMatch(sourcerow[0], sourcerow[2], 1)
-                    self.printdot()
+                    self._matchStatus.setStatus(sourcerow[0], sourcerow[2], 1)
+                    self.writeUnmatched(sourcerow, 1)
                     continue
 
-                fileMatchStatus[filePath] = 0
-                if not self._doCompare:
-                    self._pfsout.writeMatch(sourcerow[0], sourcerow[2], 0)
-                self.printdot()
+                self._matchStatus.setStatus(sourcerow[0], sourcerow[2], 0)
+                if self._doCompare:
+                    self.writeCompareRows(sourcerow, matchRow)
+                else:
+                    self.writeMatch(sourcerow[0], sourcerow[2], 0)
 
             # match files target vs. source to find extras
-            for targetrow in self._targetDB[1].execute(joinQuery):
-                filePath = "\\".join((targetrow[0], targetrow[2]))
-                if filePath not in fileMatchStatus:
+            for targetrow in self._targetDB[1].execute(scanQuery):
+                if self._matchStatus.getStatus(targetrow[0], targetrow[2]) is None:
                     self._countFiles += 1
-                    fileMatchStatus[filePath] = 2
-                    self._pfsout.writeMatch(targetrow[0], targetrow[2], 2)
-                    self.printdot()
+                    if self._countFiles >= self._progressCount:
+                        self.printProgress()
+                    self._matchStatus.setStatus(targetrow[0], targetrow[2], 2)
+                    self.writeUnmatched(targetrow, 2)
         finally:
-            self._pfsout.flushMatches()
+            self.flushOutput()
 
-        return fileMatchStatus
+    def writeCompareRows(self, sourceRow, targetRow):
+        """Add a file's source and target row (dirlist.path followed by the
+        filelist columns) to the batch compared and written to the output.
+        """
+        if len(self._matchBatch) > 0:
+            # keep the order of results
+            self.flushBatches()
+        self._compareBatch.append((sourceRow, targetRow))
+        if len(self._compareBatch) >= OUTPUT_BATCH_SIZE:
+            self.flushBatches()
 
-    def compareFiles(self, fileMatchStatus):
-        try:
-            # resulting row pattern:
-            # dirlist.path, dirlist.id = filelist.path, filelist.filename...
-            filelistCols = (
-                ", ".join(("filelist." + c) for c in self._commonColNames)
-            ).strip(", ")
-            joinQuery = (
-                f"SELECT dirlist.path, {filelistCols} FROM dirlist"
-                + " INNER JOIN filelist ON dirlist.id = filelist.path"
+    def writeUnmatched(self, row, matchStatus):
+        """Write a lonely (1) or extra (2) file given by its row (dirlist.path
+        followed by the filelist columns), or keep the row for move detection.
+        """
+        if self._moveCandidates is not None:
+            self._moveCandidates[matchStatus - 1].append(
+                tuple(row[: len(self._commonColNames) + 1])
             )
-            matchQuery = joinQuery + " WHERE dirlist.path = ? AND filelist.filename = ?"
+            return
+        self.writeMatch(row[0], row[2], matchStatus)
+
+    def matchMoves(self):
+        """Pair the lonely and extra files kept during matching by signature,
+        write the pairs as moved or renamed and the remaining files as lonely
+        or extra.
+        """
+        lonelyRows, extraRows = self._moveCandidates
+        self._moveCandidates = None
+        try:
+            if not self._doCompare:
+                print("No common attributes to detect moves by.")
+                moves = []
+            else:
+                moves, lonelyRows, extraRows = pfsmove.matchmoves(
+                    lonelyRows,
+                    extraRows,
+                    pfsmove.getsignatureindices(self._commonColNames),
+                )
+
+            rows = [
+                (sourceRow[0], sourceRow[2], targetRow[0], targetRow[2], status)
+                for sourceRow, targetRow, status in moves
+            ]
+            for start in range(0, len(rows), OUTPUT_BATCH_SIZE):
+                batch = rows[start : start + OUTPUT_BATCH_SIZE]
+                with self._profile.phase("output"):
+                    self._pfsout.writeMoves(batch)
+                self._profile.addRows("output", len(batch))
+            for row in rows:
+                self._moveCounts[row[4] - pfsmove.MOVED] += 1
 
-            # compare matching file's properties (existing in both DBs)
-            for files in fileMatchStatus.items():
-                if files[1] == 0:
-                    lastslash = files[0].rindex("\\")
-                    (path, filename) = (files[0][:lastslash], files[0][lastslash + 1 :])
-                    res = self._sourceDB[1].execute(matchQuery, (path, filename))
-                    sourceRow = res.fetchone()
-                    res = self._targetDB[1].execute(matchQuery, (path, filename))
-                    targetRow = res.fetchone()
-
-                    differences = []
-                    for i in range(3, len(self._commonColNames) + 1):
-                        if not sourceRow[i] == targetRow[i]:
-                            differences.append(i - 1)
-
-                    if len(differences) > 0:
-                        self._differingFileCount += 1
-
-                    self._pfsout.writeCompare(
-                        path, filename, differences, sourceRow, targetRow
-                    )
+            for rows, matchStatus in ((lonelyRows, 1), (extraRows, 2)):
+                for row in rows:
+                    self.writeMatch(row[0], row[2], matchStatus)
         finally:
+            self.flushOutput()
+
+    def writeMatch(self, filePath, fileName, matchStatus):
+        """Add a match result to the batch written to the output."""
+        if matchStatus == 0 and self._onlyChanges:
+            return
+        if len(self._compareBatch) > 0:
+            # keep the order of results
+            self.flushBatches()
+        self._matchBatch.append((filePath, fileName, matchStatus))
+        if len(self._matchBatch) >= OUTPUT_BATCH_SIZE:
+            self.flushBatches()
+
+    def writeDirMatch(self, dirPath, matchStatus, fileCount):
+        """Write a sub-tree result after the results batched before."""
+        if matchStatus == 0 and self._onlyChanges:
+            return
+        self.flushBatches()
+        with self._profile.phase("output"):
+            self._pfsout.writeDirMatch(dirPath, matchStatus, fileCount)
+        self._profile.addRows("output", 1)
+
+    def flushOutput(self):
+        """Write the batched results and flush the output."""
+        self.flushBatches()
+        with self._profile.phase("output"):
+            self._pfsout.flushMatches()
             self._pfsout.flushCompares()
 
-    def getResultStats(self, fileMatchStatus):
-        commonFileNum = sum(1 for m in fileMatchStatus.values() if m == 0)
-        lonelyFileNum = sum(1 for m in fileMatchStatus.values() if m == 1)
-        extraFileNum = sum(1 for m in fileMatchStatus.values() if m == 2)
+    def flushBatches(self):
+        """Write the batched results to the output."""
+        if len(self._matchBatch) > 0:
+            batch, self._matchBatch = self._matchBatch, []
+            with self._profile.phase("output"):
+                self._pfsout.writeMatches(batch)
+            self._profile.addRows("output", len(batch))
+        if len(self._compareBatch) > 0:
+            batch, self._compareBatch = self._compareBatch, []
+            self.compareBatch(batch)
+
+    def compareBatch(self, pairs):
+        """Compare the common columns of a batch of (sourceRow, targetRow) pairs
+        of common files, vectorized if NumPy is installed, and write the results.
+        """
+        with self._profile.phase("compare"):
+            signs, differences = pfscompare.comparebatch(
+                pairs, len(self._commonColNames)
+            )
+        self._profile.addRows("compare", len(pairs))
+        differing = [k for k, d in enumerate(differences) if len(d) > 0]
+        self._differingFileCount += len(differing)
+        for k in differing:
+            self._matchStatus.addDiffering(pairs[k][0][0])
+
+        if self._onlyChanges:
+            # write different files only
+            if len(differing) == 0:
+                return
+            pairs = [pairs[k] for k in differing]
+            differences = [differences[k] for k in differing]
+            signs = pfscompare.selectrows(signs, differing)
+
+        rows = [
+            (sourceRow[0], sourceRow[2], fileDifferences, sourceRow, targetRow)
+            for (sourceRow, targetRow), fileDifferences in zip(pairs, differences)
+        ]
+        with self._profile.phase("output"):
+            self._pfsout.writeCompares(rows, signs)
+        self._profile.addRows("output", len(rows))
+
+    def getResultStats(self):
+        commonFileNum, lonelyFileNum, extraFileNum = self._matchStatus.Counts
+        fileNum = self._matchStatus.FileCount
 
         if not self._doCompare:
-            return (len(fileMatchStatus), commonFileNum, lonelyFileNum, extraFileNum)
+            return (fileNum, commonFileNum, lonelyFileNum, extraFileNum)
 
         return (
-            len(fileMatchStatus),
+            fileNum,
             commonFileNum,
             lonelyFileNum,
             extraFileNum,
@@ -269,13 +1564,26 @@ class PFSRun:
             self._differingFileCount,
         )
 
-    def printResults(self, resultStats):
-        if self._params.ShowDots:
-            if self._countFiles < self._params.FilesPerDot:
-                print(".", end="")
+    def getStatsCounts(self):
+        """Return a dictionary with the counts of a run stored in addition to
+        the result statistics: the files per sync status with --base, and how
+        often and how long the comparison waited for a full output queue with
+        --async-output.
+        """
+        counts = {}
+        if self._params.BaseDB is not None:
+            counts.update(zip(pfssync.SYNC_STATS_NAMES, self._syncCounts))
+        if self._params.AsyncOutput:
+            counts["nqueuefull"] = self._pfsout.BlockedPuts
+            counts["queuewaittime"] = self._pfsout.BlockedTime
+        return counts
 
+    def printResults(self, resultStats):
         print("")
-        print("Match results:")
+        if self._showTarget:
+            print(f"Match results for '{self._params.TargetDB}':")
+        else:
+            print("Match results:")
         print("\t# of files:  {0:5}".format(resultStats[0]))
         print(
             "\t# of common: {0:5}\t# of lonely:    {1:5}\t# of extra:     {2:5}".format(
@@ -290,10 +1598,78 @@ class PFSRun:
                     resultStats[4], resultStats[5]
                 )
             )
+        if self._params.DetectMoves:
+            print(
+                "\t# of moved:  {0:5}\t# of renamed:   {1:5}".format(
+                    self._moveCounts[0], self._moveCounts[1]
+                )
+            )
+        if self._params.BaseDB is not None:
+            unchangedCount, sourceCount, targetCount, conflictCount = self._syncCounts
+            print(
+                "\t# of unchanged:      {0:5}\t# of conflicts:       {1:5}".format(
+                    unchangedCount, conflictCount
+                )
+            )
+            print(
+                "\t# of source changed: {0:5}\t# of target changed: {1:5}".format(
+                    sourceCount, targetCount
+                )
+            )
+        if self._params.AsyncOutput:
+            print(
+                "Output queue was full {0} times, waited {1:.2f} seconds.".format(
+                    self._pfsout.BlockedPuts, self._pfsout.BlockedTime
+                )
+            )
 
     def closeFileListDB(self, db):
         pfsql.closedb(db)
 
-    def printdot(self):
-        if self._params.ShowDots and self._countFiles % self._params.FilesPerDot == 0:
-            print(".", end="", flush=True)
+    def getMatchRowCount(self):
+        """Return the number of files in both databases (in directories matching
+        the directory condition), i.e. the rows read by the match phase.
+        """
+        countQuery = "SELECT COUNT(*) FROM filelist"
+        if len(self._dirConditions) > 0:
+            countQuery = (
+                "SELECT COUNT(*) FROM dirlist"
+                + " INNER JOIN filelist ON dirlist.id = filelist.path"
+                + " WHERE "
+                + self.getDirCondition("dirlist")
+            )
+        return sum(
+            db[1].execute(countQuery).fetchone()[0]
+            for db in (self._sourceDB, self._targetDB)
+        )
+
+    def startProgress(self, name, getTotal):
+        """Start reporting the progress of phase name, if shown, with the total
+        number of rows returned by getTotal (counted up front).
+        """
+        if self._progress is None:
+            return
+        self._progress.start(name, getTotal())
+        self._progressBase = (self._countFiles, self._matchStatus.Counts[0])
+        self._progressCount = self._countFiles + pfsprogress.PROGRESS_CHECK_ROWS
+
+    def getProgressRows(self):
+        """Return the number of rows read in the current phase: one per file
+        and another one per common file, which is read from both databases.
+        """
+        countFiles, commonCount = self._progressBase
+        return self._countFiles - countFiles + self._matchStatus.Counts[0] - commonCount
+
+    def printProgress(self):
+        """Print the progress if due, called by the matching loops when
+        _countFiles reaches _progressCount.
+        """
+        self._progress.update(self.getProgressRows())
+        self._progressCount = self._countFiles + pfsprogress.PROGRESS_CHECK_ROWS
+
+    def finishProgress(self):
+        """End reporting the progress of the current phase."""
+        if self._progressCount == sys.maxsize:
+            return
+        self._progress.finish(self.getProgressRows())
+        self._progressCount = sys.maxsize
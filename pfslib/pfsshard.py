@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/16/2023"
+
+"""Module with helpers for comparing file listings in shards partitioned by
+ranges of directory paths, which are processed by separate worker processes.
+"""
+
+# local imports
+import pfslib.pfsout as pfsout
+
+
+def getpathliteral(path):
+    """Return a directory path as SQL string literal for a directory condition,
+    with braces doubled for str.format.
+    """
+    literal = "'" + path.replace("'", "''") + "'"
+    return literal.replace("{", "{{").replace("}", "}}")
+
+
+def getshardbounds(dirFileCounts, shardCount):
+    """Return the directory paths splitting the sorted paths of dirFileCounts
+    (mapping path to number of files) into at most shardCount ranges with
+    about the same number of files.
+    """
+    totalCount = sum(dirFileCounts.values())
+    bounds = []
+    fileCount = 0
+    for path in sorted(dirFileCounts):
+        if fileCount >= totalCount * (len(bounds) + 1) / shardCount:
+            bounds.append(path)
+            if len(bounds) == shardCount - 1:
+                break
+        fileCount += dirFileCounts[path]
+    return bounds
+
+
+def getshardconditions(bounds):
+    """Return the directory conditions of the shards given by their bounds,
+    one per range of paths: below the first bound, between two bounds and
+    from the last bound on. The conditions can use an index on dirlist(path).
+    """
+    if len(bounds) == 0:
+        return ["1"]
+
+    literals = [getpathliteral(path) for path in bounds]
+    conditions = [f"{{d}}.path < {literals[0]}"]
+    for lower, upper in zip(literals, literals[1:]):
+        conditions.append(f"{{d}}.path >= {lower} AND {{d}}.path < {upper}")
+    conditions.append(f"{{d}}.path >= {literals[-1]}")
+    return conditions
+
+
+class PFSOutCollect(pfsout.PFSOut):
+    """Class collecting the results of a shard, to be replayed into the output
+    object of the main process in shard order.
+    """
+
+    def __init__(self, commonColNames):
+        super().__init__(commonColNames)
+        self._calls = []
+
+    def getCalls(self, doc="Return the list of collected (method name, args)"):
+        return self._calls
+
+    Calls = property(getCalls)
+
+    def writeMatches(self, rows):
+        self._calls.append(("writeMatches", (list(rows),)))
+
+    def writeCompares(self, rows, signs=None):
+        # rows are tuples, so results can be passed to the main process
+        rows = [
+            (filePath, fileName, differences, tuple(sourceRow), tuple(targetRow))
+            for filePath, fileName, differences, sourceRow, targetRow in rows
+        ]
+        self._calls.append(("writeCompares", (rows, signs)))
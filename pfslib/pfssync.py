@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/17/2023"
+
+"""Module with the classification of files in a three-way comparison of source
+and target against a common base listing, e.g. the listing of the last sync,
+telling which side changed a file since then.
+"""
+
+# sync status of a file unchanged on both sides, or changed alike on both
+UNCHANGED = 5
+
+# sync status of a file changed (added, deleted or modified) on source only
+SOURCE_CHANGED = 6
+
+# sync status of a file changed on target only
+TARGET_CHANGED = 7
+
+# sync status of a file changed differently on both sides
+CONFLICT = 8
+
+# names of the file counts per sync status, stored with the run statistics
+SYNC_STATS_NAMES = ("nunchanged", "nsourcechanged", "ntargetchanged", "nconflicts")
+
+
+def getversion(row, colIndices):
+    """Return the version of a file compared by classifysync: the tuple of the
+    row items at colIndices, or None if the row is None (file missing).
+    """
+    if row is None:
+        return None
+    return tuple(row[i] for i in colIndices)
+
+
+def classifysync(baseVersion, sourceVersion, targetVersion):
+    """Return the sync status of a file given by its version in base, source and
+    target: a tuple of its compared attributes, None if the file is missing.
+    A file changed the same way on both sides (including deleted on both)
+    needs no sync and is unchanged.
+    """
+    if sourceVersion == baseVersion:
+        return UNCHANGED if targetVersion == baseVersion else TARGET_CHANGED
+    if targetVersion == baseVersion:
+        return SOURCE_CHANGED
+    return UNCHANGED if sourceVersion == targetVersion else CONFLICT
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/17/2023"
+
+"""Tests of the prepared listing cache.
+"""
+
+# standard imports
+import pathlib
+import sqlite3
+import tempfile
+import unittest
+
+# local imports
+import pfslib.pfsgenerate as pfsgenerate
+import pfslib.pfskeycache as pfskeycache
+
+
+def countfiles(dbFileName):
+    """Return the number of files in a listing or cache database file."""
+    con = sqlite3.connect(dbFileName)
+    try:
+        return con.execute("SELECT COUNT(*) FROM filelist").fetchone()[0]
+    finally:
+        con.close()
+
+
+class TestKeyCache(unittest.TestCase):
+    def setUp(self):
+        self._tempDir = tempfile.TemporaryDirectory()
+        self._dir = pathlib.Path(self._tempDir.name)
+        self._source = str(self._dir / "s.db")
+        self._target = str(self._dir / "t.db")
+        pfsgenerate.generatelistings(self._source, self._target, 500, seed=1)
+
+    def tearDown(self):
+        self._tempDir.cleanup()
+
+    def test_rebuild_after_wal_commit(self):
+        # a writer keeps its changes in the write-ahead log while connected
+        con = sqlite3.connect(self._target)
+        try:
+            con.execute("PRAGMA journal_mode = wal")
+            con.execute("PRAGMA wal_autocheckpoint = 0")
+            cachePath, built = pfskeycache.getpreparedlisting(self._target)
+            self.assertTrue(built)
+
+            con.execute("DELETE FROM filelist WHERE id <= 50")
+            con.commit()
+            cachePath, built = pfskeycache.getpreparedlisting(self._target)
+            self.assertTrue(built)
+            self.assertEqual(countfiles(cachePath), countfiles(self._target))
+        finally:
+            con.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+__author__ = "Michael Heise"
+__copyright__ = "Copyright (C) 2023 by Michael Heise"
+__license__ = "LGPL"
+__version__ = "0.2.0"
+__date__ = "07/17/2023"
+
+"""Tests of the SQLite outfile handling of incremental runs.
+"""
+
+# standard imports
+import pathlib
+import sqlite3
+import tempfile
+import unittest
+
+# local imports
+import pfslib.pfsargparse as pfsargparse
+import pfslib.pfsgenerate as pfsgenerate
+import pfslib.pfsoutsqlite as pfsoutsqlite
+import pfslib.pfsparams as pfsparams
+import pfslib.pfsrun as pfsrun
+
+
+def runpfs(*args):
+    """Run a comparison with the given commandline arguments."""
+    parser = pfsargparse.PFSArgParse(description="test")
+    params = pfsparams.PFSParams(parser.parse_args(["-n"] + list(args)))
+    pfsrun.PFSRun(params).Run()
+
+
+def counttable(dbFileName, tableName):
+    """Return the number of rows in table tableName of a database file."""
+    con = sqlite3.connect(dbFileName)
+    try:
+        return con.execute(f"SELECT COUNT(*) FROM {tableName}").fetchone()[0]
+    finally:
+        con.close()
+
+
+class TestIncrementalUpdate(unittest.TestCase):
+    def setUp(self):
+        self._tempDir = tempfile.TemporaryDirectory()
+        self._dir = pathlib.Path(self._tempDir.name)
+        self._source = str(self._dir / "s.db")
+        self._target = str(self._dir / "t.db")
+        self._results = str(self._dir / "results.db")
+        pfsgenerate.generatelistings(self._source, self._target, 500, seed=1)
+
+    def tearDown(self):
+        self._tempDir.cleanup()
+
+    def test_readdirstates_without_dirstate(self):
+        runpfs(self._source, self._target, self._results)
+        self.assertIsNone(
+            pfsoutsqlite.readdirstates(self._results, self._source, self._target)
+        )
+
+    def test_readdirstates_without_stats(self):
+        con = sqlite3.connect(self._results)
+        con.execute("CREATE TABLE dirstate (path PRIMARY KEY)")
+        con.close()
+        self.assertIsNone(
+            pfsoutsqlite.readdirstates(self._results, self._source, self._target)
+        )
+
+    def test_first_incremental_update(self):
+        runpfs(self._source, self._target, self._results)
+        fileCount = counttable(self._results, "filecomp")
+
+        runpfs("-u", "--incremental", self._source, self._target, self._results)
+        self.assertEqual(counttable(self._results, "filecomp"), fileCount)
+        self.assertGreater(counttable(self._results, "dirstate"), 0)
+        self.assertIsNotNone(
+            pfsoutsqlite.readdirstates(self._results, self._source, self._target)
+        )
+
+
+class TestInsert(unittest.TestCase):
+    def setUp(self):
+        self._tempDir = tempfile.TemporaryDirectory()
+        self._results = str(pathlib.Path(self._tempDir.name) / "results.db")
+
+    def tearDown(self):
+        self._tempDir.cleanup()
+
+    def insertmatches(self, bulk):
+        pfsOut = pfsoutsqlite.PFSOutSqlite(self._results, [], batchSize=3, bulk=bulk)
+        pfsOut.openout("w")
+        # a lone surrogate cannot be encoded for SQLite
+        pfsOut.writeMatches([("d", "a", 1), ("d", "b", 1), ("d", "\udcff", 1)])
+        pfsOut.writeMatches([("d", "c", 2)])
+        pfsOut.flushMatches()
+        pfsOut.finish()
+        pfsOut.close()
+        return counttable(self._results, "filecomp")
+
+    def test_keep_valid_rows_of_failed_batch(self):
+        self.assertEqual(self.insertmatches(bulk=False), 3)
+
+    def test_keep_valid_rows_of_failed_batch_bulk(self):
+        self.assertEqual(self.insertmatches(bulk=True), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()